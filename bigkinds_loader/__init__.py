@@ -1 +1,21 @@
-from .core import Scraper
\ No newline at end of file
+from .core import Scraper
+from .dead_letter import DeadLetters, redrive
+from .engine import Engine, get_engine, init_engine
+from .enumerator import enumerate_ids
+from .fts import FullTextIndex
+from .id_store import NewsIdStore
+from .jsonl_index import JsonlReader, build_index
+from .layout import get_collection
+from .migrate import migrate
+from .parquet import export_parquet
+from .planner import plan
+from .reader import NewsReader
+from .record import Article, content_hash, decode_detail
+from .revalidate import revalidate
+from .seen import BloomFilter, ScalableBloomFilter, SeenSet
+from .service import Service
+from .snapshot import export_snapshot, read_snapshot
+from .stage import BatchStage
+from .summary import DailySummary
+from .work_queue import WorkQueue, split_period
+from .writer import MongoWriter
\ No newline at end of file
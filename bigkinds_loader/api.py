@@ -0,0 +1,52 @@
+import json
+from pathlib import Path
+from typing import Dict, List
+
+
+SEARCH_URL = 'https://www.bigkinds.or.kr/api/news/search.do'
+DETAIL_URL = 'https://www.bigkinds.or.kr/news/detailView.do'
+HEADERS = {
+    "Referer": 'https://www.bigkinds.or.kr/v2/news/index.do',
+    "User-Agent": 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36'
+}
+PRESS_CODE_FILE = Path('env/press_code.json')
+
+
+def search_payload(press_codes: List[str],
+                   begin: str,
+                   end: str,
+                   start_no: int      = 1,
+                   result_number: int = 100
+                  ) -> Dict:
+    """Body of a `search.do` request, `start_no` is the 1-based page number."""
+    return {
+        "searchSortType": "date",
+        "sortMethod": "date",
+        "startDate": begin,
+        "endDate": end,
+        "providerCodes": press_codes,
+        "startNo": str(start_no),
+        "resultNumber": str(result_number),
+        "isTmUsable": False,
+        "isNotTmUsable": False
+    }
+
+
+def detail_params(news_id: str) -> Dict[str, str]:
+    return {
+        "docId": news_id,
+        "returnCnt": '1',
+        "sectionDiv": '1000'
+    }
+
+
+def load_press_code(file: Path = PRESS_CODE_FILE) -> Dict[str, str]:
+    """Mapping from the press name to its provider code, read from a list of
+    `{"press": ..., "code": ...}`."""
+    if not file.exists():
+        raise FileNotFoundError(f'fail to find the reference mapping press to code: {file}')
+
+    return {
+        item['press']: item['code']
+        for item in json.loads(file.read_text())
+    }
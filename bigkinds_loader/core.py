@@ -1,34 +1,69 @@
+from collections import Counter
 from datetime import datetime, timedelta
+from functools import partial
 from typing import Literal
 import httpx
 import logging
 from loguru import logger
-import os
+import msgspec
 from pathlib import Path
-from playwright.sync_api import sync_playwright, Page
-from pymongo import MongoClient
+from playwright.sync_api import sync_playwright, Browser, Page, Playwright
 import sys
+import time
 from tqdm import trange
-from typing import Dict, Generator, Optional
+from typing import Dict, Generator, Iterable, Optional, Sequence
+
+from .api import DETAIL_URL, HEADERS, detail_params
+from .dead_letter import DeadLetters
+from .engine import get_engine
+from .enrich import RAW_FIELDS
+from .enumerator import enumerate_ids, id_path
+from .fts import FullTextIndex
+from .id_store import NewsIdStore
+from .layout import Layout, get_collection, parse_date, to_consolidated
+from .logs import ShardSummary, sampler, setup_logging
+from .record import decode_detail
+from .seen import ScalableBloomFilter, SeenSet
+from .stage import BatchStage, pipeline_stages
+from .summary import DailySummary
+from .writer import MongoWriter
 
 
 class Scraper:
-    url = 'https://www.bigkinds.or.kr/news/detailView.do'
-    params = {
-        "docId":'',
-        "returnCnt":'1',
-        "sectionDiv":'1000'
-    }
-    client = httpx.Client(
-        headers = {
-            "Referer": 'https://www.bigkinds.or.kr/v2/news/index.do',
-            "User-Agent": 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36'
-        }
-    )
+    url = DETAIL_URL
+    params = detail_params('')
+    client = httpx.Client(headers=HEADERS)
+
+
+    def __init__(self, keep_browser: bool = False) -> None:
+        """
+        Args:
+            `keep_browser`: keep chromium running between the `get_news_batch`
+                            calls of a long-lived process instead of launching
+                            it for every period
+        """
+        self.keep_browser = keep_browser
+        self.__playwright: Optional[Playwright] = None
+        self.__browser: Optional[Browser] = None
 
 
-    def __init__(self) -> None:
-        pass
+    def __launch(self, headless: bool) -> Browser:
+        if self.__browser is not None and not self.__browser.is_connected():
+            self.close()
+        if self.__browser is None:
+            self.__playwright = sync_playwright().start()
+            self.__browser = self.__playwright.chromium.launch(headless=headless, slow_mo=100)
+        return self.__browser
+
+
+    def close(self) -> None:
+        """Stop the browser, if any."""
+        if self.__browser is not None:
+            if self.__browser.is_connected():
+                self.__browser.close()
+            self.__playwright.stop()
+        self.__playwright = None
+        self.__browser = None
 
 
     @staticmethod
@@ -72,68 +107,89 @@ class Scraper:
         begin_date = datetime.strptime(begin, '%Y-%m-%d')
         end_date = datetime.strptime(end, '%Y-%m-%d')
 
-        p = sync_playwright().start()
-        browser = p.chromium.launch(headless=headless, slow_mo=100)
-        page = browser.new_page()
-
-        page.goto(
-            'https://www.bigkinds.or.kr/v2/news/index.do',
-            wait_until = 'domcontentloaded',
-            timeout = timeout
-        )
-        page.click(f'label:has-text("{press}")')
-        page.click('a:has-text("기간")')
-
-        target_date = begin_date
-        while target_date <= end_date:
-            page.fill('input#search-begin-date', self.__datetime_to_str(target_date))
-            page.fill('input#search-end-date', self.__datetime_to_str(target_date))
-            page.click('button.news-report-search-btn')
-
-            n_pages = self.__get_n_pages(page)
-            if n_pages is not None:
-                for i in trange(int(n_pages), desc=f'date: {self.__datetime_to_str(target_date)}'):
-                    page                     \
-                    .locator('div.news-item') \
-                    .first                    \
-                    .wait_for(timeout=timeout)
-
-                    for item in page.locator('div.news-item').all():
-                        yield item.get_attribute('data-id')
-
-                    page.fill('input#paging_news_result', str(i+2))
-                    page.keyboard.press('Enter', delay=20000)
-            else:
-                logger.info(f'fail to fetch news for {press} at {self.__datetime_to_str(target_date)}')
-                sys.exit()
-
-            page.click('button#collapse-step-1')
-            target_date += timedelta(1)
+        page = self.__launch(headless).new_page()
+        try:
+            page.goto(
+                'https://www.bigkinds.or.kr/v2/news/index.do',
+                wait_until = 'domcontentloaded',
+                timeout = timeout
+            )
+            page.click(f'label:has-text("{press}")')
+            page.click('a:has-text("기간")')
+
+            target_date = begin_date
+            while target_date <= end_date:
+                page.fill('input#search-begin-date', self.__datetime_to_str(target_date))
+                page.fill('input#search-end-date', self.__datetime_to_str(target_date))
+                page.click('button.news-report-search-btn')
+
+                n_pages = self.__get_n_pages(page)
+                if n_pages is not None:
+                    for i in trange(int(n_pages), desc=f'date: {self.__datetime_to_str(target_date)}'):
+                        page                     \
+                        .locator('div.news-item') \
+                        .first                    \
+                        .wait_for(timeout=timeout)
+
+                        for item in page.locator('div.news-item').all():
+                            yield item.get_attribute('data-id')
+
+                        page.fill('input#paging_news_result', str(i+2))
+                        page.keyboard.press('Enter', delay=20000)
+                else:
+                    logger.info(f'fail to fetch news for {press} at {self.__datetime_to_str(target_date)}')
+                    sys.exit()
+
+                page.click('button#collapse-step-1')
+                target_date += timedelta(1)
+        finally:
+            page.close()
+            if not self.keep_browser:
+                self.close()
+
+
+    def get_news_instance(self,
+                          news_id: str | None,
+                          raw_fields: Sequence[str] = ()
+                         ) -> Dict[str, str]:
+        """Get the content of a news article.
 
-
-    def get_news_instance(self, news_id: str | None) -> Dict[str, str]:
-        """Get the content of a news article."""
+        Args:
+            `news_id`:    id of the news article
+            `raw_fields`: fields of the detail payload kept untouched under `raw`
+        """
         if news_id is not None:
             self.params['docId'] = news_id
-            r = self.client.get(self.url, params=self.params)
-            item = {
-                'date': '',
-                'title': '',
-                'content': '',
-                'news_id': news_id,
-                'status': str(r.status_code)
-            }
+            try:
+                r = self.client.get(self.url, params=self.params)
+            except httpx.HTTPError as e:
+                if sampler.allow('fail to query news'):
+                    logger.info(f'fail to query news: {e!r}')
+                return {'news_id': news_id, 'status': '-1', 'error': type(e).__name__}
 
             if r.status_code == httpx.codes.OK:
-                detail = r.json()['detail']
-                item['date'] = detail['DATE']
-                item['title'] = detail['TITLE']
-                item['content'] = detail['CONTENT']
-                logger.info('query success')
+                try:
+                    item = decode_detail(r.content, news_id, raw_fields).to_doc()
+                except msgspec.DecodeError as e:
+                    # a malformed payload is a failed fetch, not a failed shard
+                    if sampler.allow('fail to decode news'):
+                        logger.info(f'fail to decode news {news_id}: {e}')
+                    return {'news_id': news_id, 'status': '-1', 'error': type(e).__name__}
+                logger.debug('query success')
             else:
-                logger.info('fail to query news')
+                item = {
+                    'date': '',
+                    'title': '',
+                    'content': '',
+                    'news_id': news_id,
+                    'status': str(r.status_code),
+                    'error': 'HTTPStatus'
+                }
+                if sampler.allow('fail to query news'):
+                    logger.info(f'fail to query news: {r.status_code}')
         else:
-            logger.info('invalid news id')
+            if sampler.allow('invalid news id'):
+                logger.info('invalid news id')
             item = {'status': '-1'}
 
         return item
@@ -145,17 +201,69 @@ class Scraper:
                        begin:str                      = '2024-01-01',
                        end: Optional[str]             = None,
                        db_name: Optional[str]         = None,
-                       collection_name: Optional[str] = None
+                       collection_name: Optional[str] = None,
+                       layout: Layout                 = 'daily',
+                       time_series: bool              = False,
+                       id_source: Literal['playwright', 'search'] = 'playwright',
+                       id_dir: str                    = 'env/data_id',
+                       batch_size: int                = 100,
+                       queue_size: int                = 1000,
+                       seen_dir: Optional[str]        = None,
+                       enrich: bool                   = False,
+                       normalize: bool                = False,
+                       strip_byline: bool             = False,
+                       strip_email: bool              = False,
+                       processes: int                 = 2,
+                       stage_batch_size: int          = 100,
+                       fts_path: Optional[str]        = None,
+                       structured_log: bool           = False,
+                       dead_letter_db: Optional[str]  = None,
+                       summary_db: Optional[str]      = None,
+                       max_rate: int                  = 100,
+                       time_period: float             = 3,
+                       proxy: Optional[str]           = None
                       ) -> None:
         """Main API to query news content based on the press name and the specified period.
 
         Args:
-            `press`:           the press of the newspaper
-            `timeout`:         configuration for playwright
-            `begin`:           begin date
-            `end`:             end date, default to begin(daily frequency)
-            `db_name`:         name of the mongodb database, default to `press`
-            `collection_name`: name of the collection, default to `begin`
+            `press`:            the press of the newspaper
+            `timeout`:          configuration for playwright
+            `begin`:            begin date
+            `end`:              end date, default to begin(daily frequency)
+            `db_name`:          name of the mongodb database, default to `press`
+            `collection_name`:  name of the collection, default to `begin`
+            `layout`:           `daily` (a collection per `begin`), `press` (one
+                                collection per press) or `single` (one collection)
+            `time_series`:      create the consolidated collection as a time series
+            `id_source`:        enumerate the news id with the browser (`playwright`) or
+                                with the `search.do` api (`search`), reusing the ids
+                                stored under `id_dir` by `enumerate_ids` if any
+            `id_dir`:           directory of the enumerated news id
+            `batch_size`:       number of documents per insert of the writer thread
+            `queue_size`:       depth of the queue in front of the writer thread,
+                                fetching blocks while it is full
+            `seen_dir`:         directory of the bloom filter of stored news id,
+                                news already in the collection are skipped
+            `enrich`:           parse the term scores, locations and categories
+            `normalize`:        store the cleaned text of `content` as `clean_content`
+            `strip_byline`:     remove the reporter byline from `clean_content`
+            `strip_email`:      remove the email addresses from `clean_content`
+            `processes`:        size of the process pool of the enrichment and
+                                normalization stages
+            `stage_batch_size`: number of documents per batch sent to the pool
+            `fts_path`:         SQLite file of the full-text index updated with every
+                                inserted batch
+            `structured_log`:   write the log as JSON records, either way the log is
+                                written in the background, failures are sampled and
+                                a single summary record is written per shard
+            `dead_letter_db`:   database of the dead letters, failed news id and search
+                                pages are recorded there for `redrive`
+            `summary_db`:       database of the per press and day summary, updated with
+                                every inserted batch and every failed fetch
+            `max_rate`:         budget of the `search` enumeration, `max_rate` requests
+                                per `time_period` seconds
+            `time_period`:      see `max_rate`
+            `proxy`:            proxy of the `search` enumeration
 
         Returns:
             None, the result will be stored in the mongo database.
@@ -166,17 +274,131 @@ class Scraper:
 
         log_dir = Path(f'log/{press}/{begin.split("-")[0]}')
         log_dir.mkdir(parents=True, exist_ok=True)
-        logger.remove()
-        logger.add(log_dir / f'{begin}_{end}.log', level='INFO')
+        setup_logging(log_dir / f'{begin}_{end}.log', structured_log)
+
+        client = get_engine().mongo()
+        collection = get_collection(
+            client,
+            press,
+            begin,
+            layout,
+            db_name,
+            collection_name,
+            time_series
+        )
+
+        target = {
+            'press': press,
+            'begin': begin,
+            'layout': layout,
+            'db_name': db_name,
+            'collection_name': collection_name,
+            'time_series': time_series
+        }
+        dead_letters = (
+            DeadLetters.from_db(client, dead_letter_db)
+            if dead_letter_db is not None
+            else
+            None
+        )
+
+        seen = (
+            # shared by the workers of a node: mapped read-only, the
+            # fetched news id are written once the shard is done
+            SeenSet(
+                ScalableBloomFilter(seen_dir, readonly=True),
+                lambda news_id: collection.count_documents({'_id': news_id}, limit=1) > 0
+            )
+            if seen_dir is not None
+            else
+            None
+        )
+
+        stages = pipeline_stages(enrich, normalize, strip_byline, strip_email)
+        raw_fields = RAW_FIELDS if enrich else ()
+
+        on_commit = []
+        daily = DailySummary.from_db(client, summary_db) if summary_db is not None else None
+        if daily is not None:
+            daily.ensure_indexes()
+            on_commit.append(partial(daily.add, press=press))
+        failures = Counter()
+        fts = FullTextIndex(fts_path) if fts_path is not None else None
+        if fts is not None:
+            on_commit.append(partial(fts.add, press=press))
+
+        id_store = None
+        if id_source == 'search':
+            file = id_path(id_dir, press, begin, end)
+            id_store = (
+                NewsIdStore.open(file)
+                if file.exists()
+                else
+                enumerate_ids(
+                    press,
+                    begin,
+                    end,
+                    id_dir,
+                    max_rate=max_rate,
+                    time_period=time_period,
+                    proxy=proxy,
+                    dead_letters=dead_letters,
+                    target=target
+                )[press]
+            )
+            news_ids: Iterable[str | None] = iter(id_store)
+        else:
+            news_ids = self.__news_id_generator(press, True, timeout, begin, end)
 
-        client = MongoClient(os.environ['CONN_STR'])
-        db = client[press if db_name is None else db_name]
-        collection = db[collection_name if collection_name is not None else begin]
+        summary = ShardSummary(f'{press}:{begin}:{end}')
 
         logger.info('start the query process')
-        for news_id in self.__news_id_generator(press, True, timeout, begin, end):
-            data  = self.get_news_instance(news_id)
-            if data['status'] == '200':
-                collection.insert_one(data)
+        try:
+            with (
+                MongoWriter(collection, batch_size, queue_size, on_commit=on_commit) as writer,
+                BatchStage(stages, writer.put, stage_batch_size, processes) as stage
+            ):
+                for news_id in news_ids:
+                    if seen is not None and news_id is not None and seen.seen(news_id):
+                        continue
+
+                    t0 = time.perf_counter()
+                    data  = self.get_news_instance(news_id, raw_fields)
+                    summary.record(data['status'], time.perf_counter() - t0)
+                    if data['status'] == '200':
+                        if layout != 'daily':
+                            data = to_consolidated(data, press)
+                        stage.put(data)
+                        if seen is not None:
+                            seen.add(news_id)
+                    elif news_id is not None:
+                        date = parse_date('', news_id)
+                        if date is not None:
+                            failures[date.strftime('%Y-%m-%d')] += 1
+                        if dead_letters is not None:
+                            dead_letters.add_news(
+                                news_id,
+                                # where the failure is counted, for `redrive` to discount it
+                                target | {'summary_db': summary_db}
+                                if daily is not None and date is not None
+                                else
+                                target,
+                                data['error'],
+                                data['status']
+                            )
+        finally:
+            # the mapping of the id store would outlive the shard in a worker or service
+            if id_store is not None:
+                id_store.close()
+            # a crawl stopped midway keeps the failures counted so far
+            if daily is not None:
+                daily.add_failures(failures, press)
+            # and its shard summary
+            summary.close()
+
+        if seen is not None:
+            seen.close()
+        if fts is not None:
+            fts.close()
 
         logger.info('end the query process')
@@ -0,0 +1,364 @@
+from aiolimiter import AsyncLimiter
+import asyncio
+from collections import Counter
+from datetime import datetime, timezone
+import httpx
+from loguru import logger
+import msgspec
+import orjson
+from pathlib import Path
+from pymongo import ASCENDING, MongoClient
+from pymongo.collection import Collection
+from functools import partial
+from typing import Awaitable, Callable, Dict, Iterable, List, Literal, Optional, Sequence, Tuple
+
+from .api import DETAIL_URL, SEARCH_URL, detail_params, load_press_code, search_payload
+from .engine import get_engine
+from .enrich import RAW_FIELDS
+from .enumerator import id_path
+from .fts import FullTextIndex
+from .id_store import NewsIdStore
+from .layout import get_collection, parse_date, to_consolidated
+from .record import decode_detail
+from .stage import BatchStage, pipeline_stages
+from .summary import DailySummary
+from .writer import MongoWriter
+
+
+DEAD_LETTERS = 'dead_letters'
+
+Kind = Literal['news', 'search']
+
+
+class DeadLetters:
+    """Failed news id and search pages kept for a later `redrive`.
+
+    Every failure is a document keyed by `{kind}:{key}` holding the error
+    class, the last status, the number of attempts, the first and last
+    failure timestamps and the `target` needed to retry it (where the news
+    goes, which search page it was). A successful retry deletes it.
+    """
+    def __init__(self, collection: Collection) -> None:
+        self.collection = collection
+
+
+    @classmethod
+    def from_db(cls, client: MongoClient, db_name: str) -> 'DeadLetters':
+        return cls(client[db_name][DEAD_LETTERS])
+
+
+    def ensure_indexes(self) -> None:
+        self.collection.create_index([('kind', ASCENDING), ('last_failed', ASCENDING)])
+
+
+    def add(self,
+            kind: Kind,
+            key: str,
+            target: Dict,
+            error: str,
+            status: Optional[int | str] = None
+           ) -> None:
+        now = datetime.now(timezone.utc)
+        self.collection.update_one(
+            {'_id': f'{kind}:{key}'},
+            {
+                '$set': {
+                    'error': error,
+                    'status': None if status is None else str(status),
+                    'last_failed': now
+                },
+                '$setOnInsert': {
+                    'kind': kind,
+                    'key': key,
+                    'target': target,
+                    'first_failed': now
+                },
+                '$inc': {'attempts': 1}
+            },
+            upsert=True
+        )
+
+
+    def add_news(self,
+                 news_id: str,
+                 target: Dict,
+                 error: str,
+                 status: Optional[int | str] = None
+                ) -> None:
+        """Args:
+            `target`: press, begin, layout, db_name, collection_name and
+                      time_series of the collection the news belongs to
+        """
+        self.add('news', news_id, target, error, status)
+
+
+    def add_search(self,
+                   press_codes: List[str],
+                   begin: str,
+                   end: str,
+                   page: int,
+                   page_size: int,
+                   target: Dict,
+                   error: str,
+                   status: Optional[int | str] = None
+                  ) -> None:
+        """Args:
+            `target`: code2press and id_dir of the enumeration
+        """
+        self.add(
+            'search',
+            f'{",".join(press_codes)}:{begin}:{end}:{page}:{page_size}',
+            target | {
+                'press_codes': press_codes,
+                'begin': begin,
+                'end': end,
+                'page': page,
+                'page_size': page_size
+            },
+            error,
+            status
+        )
+
+
+    def resolve(self, items: Iterable[Dict]) -> None:
+        ids = [item['_id'] for item in items]
+        if len(ids) > 0:
+            self.collection.delete_many({'_id': {'$in': ids}})
+
+
+    def pending(self, kind: Kind, max_attempts: Optional[int] = None) -> List[Dict]:
+        filter = {'kind': kind}
+        if max_attempts is not None:
+            filter['attempts'] = {'$lt': max_attempts}
+        return list(self.collection.find(filter).sort('first_failed', ASCENDING))
+
+
+    def import_jsonl(self, file: Path | str) -> int:
+        """Load the failures written to a file by the deprecated httpx scraper."""
+        n = 0
+        with open(file, 'rb') as f:
+            for line in f:
+                if line.strip() == b'':
+                    continue
+                item = orjson.loads(line)
+                self.add(item['kind'], item['key'], item['target'], item['error'], item.get('status'))
+                n += 1
+        return n
+
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            item['_id']: item['count']
+            for item in self.collection.aggregate([
+                {'$group': {'_id': '$kind', 'count': {'$sum': 1}}}
+            ])
+        }
+
+
+async def _retry_news(client: httpx.AsyncClient,
+                      limiter: AsyncLimiter,
+                      item: Dict,
+                      raw_fields: Sequence[str] = ()
+                     ) -> Tuple[Dict, Optional[Dict], str, Optional[str]]:
+    """(dead letter, fetched news or None, error class, status)"""
+    news_id = item['key']
+    async with limiter:
+        try:
+            r = await client.get(DETAIL_URL, params=detail_params(news_id))
+        except httpx.HTTPError as e:
+            return item, None, type(e).__name__, None
+
+    if r.status_code != httpx.codes.OK:
+        return item, None, 'HTTPStatus', str(r.status_code)
+
+    try:
+        return item, decode_detail(r.content, news_id, raw_fields).to_doc(), '', str(r.status_code)
+    except msgspec.DecodeError as e:
+        return item, None, type(e).__name__, str(r.status_code)
+
+
+async def _retry_search(client: httpx.AsyncClient,
+                        limiter: AsyncLimiter,
+                        item: Dict
+                       ) -> Tuple[Dict, Optional[List[str]], str, Optional[str]]:
+    """(dead letter, news id of the page or None, error class, status)"""
+    t = item['target']
+    async with limiter:
+        try:
+            r = await client.post(
+                SEARCH_URL,
+                json=search_payload(t['press_codes'], t['begin'], t['end'], t['page'], t['page_size'])
+            )
+        except httpx.HTTPError as e:
+            return item, None, type(e).__name__, None
+
+    if r.status_code != httpx.codes.OK:
+        return item, None, 'HTTPStatus', str(r.status_code)
+    return item, [res['NEWS_ID'] for res in r.json()['resultList']], '', str(r.status_code)
+
+
+async def _gather(func: Callable[[httpx.AsyncClient, AsyncLimiter, Dict], Awaitable[Tuple]],
+                  items: List[Dict],
+                  max_rate: int,
+                  time_period: float,
+                  timeout: float,
+                  proxy: Optional[str]
+                 ) -> List[Tuple]:
+    limiter = AsyncLimiter(max_rate, time_period)
+    client = get_engine().client(proxy, timeout)
+    async with asyncio.TaskGroup() as tg:
+        tasks = [tg.create_task(func(client, limiter, item)) for item in items]
+    return [task.result() for task in tasks]
+
+
+def redrive(dead_letters: DeadLetters,
+            client: Optional[MongoClient] = None,
+            max_rate: int                 = 20,
+            time_period: float            = 3,
+            max_attempts: int             = 10,
+            batch_size: int               = 100,
+            timeout: float                = 300,
+            proxy: Optional[str]          = None,
+            import_dir: Optional[str]     = None,
+            summary_db: Optional[str]     = None,
+            enrich: bool                  = False,
+            normalize: bool               = False,
+            strip_byline: bool            = False,
+            strip_email: bool             = False,
+            processes: int                = 2,
+            stage_batch_size: int         = 100,
+            fts_path: Optional[str]       = None
+           ) -> Dict[str, int]:
+    """Retry the dead letters in bulk under their own rate budget.
+
+    Failed search pages are fetched first: their news id are merged into the
+    id store of their press and period, if it was saved (an incomplete
+    enumeration isn't, and is enumerated again by the next crawl), and
+    become news dead letters, so they're fetched in the same run. Failed news are then fetched and
+    written to the collection they were meant for. Items still failing have
+    their attempts increased, and are left alone once they reach
+    `max_attempts`.
+
+    The `.dead` files written by the deprecated httpx scraper under
+    `import_dir` are loaded (and removed) first.
+
+    Recovered news go through the enrichment and normalization stages and
+    the full-text index of `fts_path` like crawled ones (`enrich` to
+    `fts_path` as in `Scraper.get_news_batch`). They're accounted for in the
+    daily summary of `summary_db` (or of the crawl which failed them), and
+    the failures counted by that crawl are discounted.
+
+    Returns:
+        the number of retried, recovered and still failing items
+    """
+    client = get_engine().mongo() if client is None else client
+    counts = {'retried': 0, 'recovered': 0, 'failed': 0}
+    dead_letters.ensure_indexes()
+
+    if import_dir is not None:
+        for file in sorted(Path(import_dir).glob('**/*.dead')):
+            logger.info(f'import {dead_letters.import_jsonl(file)} dead letters from {file}')
+            file.unlink()
+
+    searches = dead_letters.pending('search', max_attempts)
+    res = get_engine().run(_gather(_retry_search, searches, max_rate, time_period, timeout, proxy))
+    recovered = []
+    for item, news_ids, error, status in res:
+        if news_ids is None:
+            dead_letters.add('search', item['key'], item['target'], error, status)
+            continue
+
+        t = item['target']
+        # pages recorded by the deprecated httpx scraper carry the codes only
+        code2press = t.get('code2press') or {v: k for k, v in load_press_code().items()}
+        by_press: Dict[str, List[str]] = {}
+        for news_id in news_ids:
+            press = code2press.get(news_id.partition('.')[0])
+            if press is not None:
+                by_press.setdefault(press, []).append(news_id)
+        for press, ids in by_press.items():
+            file = id_path(t.get('id_dir', 'env/data_id'), press, t['begin'], t['end'])
+            # a missing store is an enumeration left unsaved because of this
+            # page: saving the page alone would pass for the whole period
+            if file.exists():
+                store = NewsIdStore.open(file)
+                merged = NewsIdStore.merge([store, NewsIdStore.from_ids(ids)])
+                store.close()
+                merged.save(file)
+            for news_id in ids:
+                dead_letters.add_news(
+                    news_id,
+                    {
+                        'press': press,
+                        'begin': news_id[9:13] + '-' + news_id[13:15] + '-' + news_id[15:17],
+                        'layout': 'daily',
+                        'db_name': None,
+                        'collection_name': None,
+                        'time_series': False
+                    } | t.get('news_target', {}),
+                    'Unfetched'
+                )
+        recovered.append(item)
+    dead_letters.resolve(recovered)
+    counts['retried'] += len(res)
+    counts['recovered'] += len(recovered)
+    counts['failed'] += len(res) - len(recovered)
+
+    news = dead_letters.pending('news', max_attempts)
+    res = get_engine().run(_gather(
+        partial(_retry_news, raw_fields=RAW_FIELDS if enrich else ()),
+        news,
+        max_rate,
+        time_period,
+        timeout,
+        proxy
+    ))
+    groups: Dict[Tuple, List[Tuple[Dict, Dict]]] = {}
+    for item, doc, error, status in res:
+        if doc is None:
+            dead_letters.add('news', item['key'], item['target'], error, status)
+            continue
+        t = item['target']
+        key = (t['press'], t['begin'], t['layout'], t['db_name'], t['collection_name'], t['time_series'])
+        groups.setdefault(key, []).append((item, doc))
+
+    stages = pipeline_stages(enrich, normalize, strip_byline, strip_email)
+    fts = FullTextIndex(fts_path) if fts_path is not None else None
+    summaries: Dict[str, DailySummary] = {}
+    for (press, begin, layout, db_name, collection_name, time_series), pairs in groups.items():
+        collection = get_collection(client, press, begin, layout, db_name, collection_name, time_series)
+        on_commit = []
+        # failed news of a crawl with a summary carry its database, see `get_news_batch`
+        recovered_in: Dict[str, Counter] = {}
+        for item, _ in pairs:
+            failed_in = item['target'].get('summary_db')
+            if failed_in is not None and (date := parse_date('', item['key'])) is not None:
+                recovered_in.setdefault(failed_in, Counter())[date.strftime('%Y-%m-%d')] -= 1
+        for name in {summary_db, *recovered_in} - {None}:
+            if name not in summaries:
+                summaries[name] = DailySummary.from_db(client, name)
+                summaries[name].ensure_indexes()
+        if (name := summary_db or next(iter(recovered_in), None)) is not None:
+            on_commit.append(partial(summaries[name].add, press=press))
+        if fts is not None:
+            on_commit.append(partial(fts.add, press=press))
+
+        with (
+            MongoWriter(collection, batch_size, on_commit=on_commit) as writer,
+            BatchStage(stages, writer.put, stage_batch_size, processes) as stage
+        ):
+            for _, doc in pairs:
+                stage.put(doc if layout == 'daily' else to_consolidated(doc, press))
+        for name, failures in recovered_in.items():
+            summaries[name].add_failures(failures, press)
+        dead_letters.resolve(item for item, _ in pairs)
+        counts['recovered'] += len(pairs)
+
+    if fts is not None:
+        fts.close()
+
+    counts['retried'] += len(res)
+    counts['failed'] += len(res) - sum(len(pairs) for pairs in groups.values())
+
+    logger.info(f'redrive: {counts}, left: {dead_letters.stats()}')
+    return counts
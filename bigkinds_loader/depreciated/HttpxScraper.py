@@ -8,16 +8,19 @@ import json
 from loguru import logger
 from multiprocessing import Pool, RLock
 import logging
-import nest_asyncio
 import orjson
 from omegaconf import ListConfig
+import os
 import sys
 from pathlib import Path
-from typing import List, Optional, Dict
+from typing import Dict, Iterable, List, Optional, Set
 from tqdm import tqdm
-from tqdm.asyncio import tqdm_asyncio
 
 from Scraper import Scraper
+from bigkinds_loader.engine import get_engine, init_engine
+from bigkinds_loader.id_store import NewsIdStore
+from bigkinds_loader.jsonl_index import save_index
+from bigkinds_loader.record import Article, decode_detail
 
 
 async def fetch_data_id(press_code: List[str],
@@ -25,7 +28,9 @@ async def fetch_data_id(press_code: List[str],
                         client: httpx.AsyncClient,
                         begin_date: str,
                         end_date: str,
-                        limiter: AsyncLimiter
+                        limiter: AsyncLimiter,
+                        failed: Optional[List[Dict]] = None,
+                        result_number: str = "100"
                         ) -> List[str]:
 
     json = {
@@ -35,53 +40,66 @@ async def fetch_data_id(press_code: List[str],
         "endDate": end_date,
         "providerCodes": press_code,
         "startNo": start_no,
-        "resultNumber": "100",
+        "resultNumber": result_number,
         "isTmUsable": False,
         "isNotTmUsable": False
     }
 
-    async with limiter:
-        try:
-            r = await client.post(
-                'https://www.bigkinds.or.kr/api/news/search.do',
-                json=json
-            )
-        except (
-            httpx.ConnectError,
-            httpx.RemoteProtocolError,
-            httpx.ReadTimeout,
-            httpx.ConnectTimeout
-        ) as e:
-
-            logger.info(f"{begin_date}/{end_date}: {e}, re-send the request")
-            json["resultNumber"] = "10"
-
-            while True:
-                try:
-                    r = await client.post(
-                        'https://www.bigkinds.or.kr/api/news/search.do',
-                        json=json
-                    )
-                    break
-
-                except (
-                    httpx.ConnectError,
-                    httpx.RemoteProtocolError,
-                    httpx.ReadTimeout,
-                    httpx.ConnectTimeout
-                ) as e:
-                    logger.info(
-                        f"{begin_date}/{end_date}: {e}, re-send the request"
-                    )
+    r = None
+    while r is None:
+        async with limiter:
+            try:
+                r = await client.post(
+                    'https://www.bigkinds.or.kr/api/news/search.do',
+                    json=json
+                )
+            except (
+                httpx.ConnectError,
+                httpx.RemoteProtocolError,
+                httpx.ReadTimeout,
+                httpx.ConnectTimeout
+            ) as e:
+                logger.info(f"{begin_date}/{end_date}: {e}, re-send the request")
+
+        if r is None and result_number != "10":
+            # `startNo` counts pages of `resultNumber`: the page is fetched
+            # again as the 10 smaller pages covering the same results
+            res = []
+            for i in range(10):
+                res += await fetch_data_id(
+                    press_code,
+                    str((int(start_no) - 1) * 10 + i + 1),
+                    client,
+                    begin_date,
+                    end_date,
+                    limiter,
+                    failed,
+                    "10"
+                )
+            return res
 
-        if r.status_code == httpx.codes.OK:
-            return [
-                item['NEWS_ID']
-                for item in r.json()['resultList']
-            ]
-        else:
-            logger.info(f"invalid request: {r.status_code}")
-            return [""]
+    if r.status_code == httpx.codes.OK:
+        return [
+            item['NEWS_ID']
+            for item in r.json()['resultList']
+        ]
+    else:
+        logger.info(f"invalid request: {r.status_code}")
+        if failed is not None:
+            failed.append(dead_letter(
+                'search',
+                f'{",".join(press_code)}:{begin_date}:{end_date}:{start_no}:{result_number}',
+                {
+                    'press_codes': press_code,
+                    'begin': begin_date,
+                    'end': end_date,
+                    'page': int(start_no),
+                    'page_size': int(result_number)
+                },
+                'HTTPStatus',
+                r.status_code
+            ))
+        return [""]
 
 
 async def async_fetch_data_id(press_code: List[str],
@@ -92,12 +110,12 @@ async def async_fetch_data_id(press_code: List[str],
                               begin_date: str,
                               end_date: str,
                               proxy: str,
-                              process_id: int
+                              process_id: int,
+                              failed: Optional[List[Dict]] = None
                               ):
-    r = httpx.post(
+    client = get_engine().client(proxy, timeout, headers)
+    r = await client.post(
         'https://www.bigkinds.or.kr/api/news/search.do',
-        headers=headers,
-        proxies=proxy,
         json={
             "searchSortType": "date",
             "sortMethod": "date",
@@ -108,41 +126,42 @@ async def async_fetch_data_id(press_code: List[str],
             "resultNumber": "100",
             "isTmUsable": False,
             "isNotTmUsable": False
-        },
-        timeout=timeout
+        }
     )
 
     if r.status_code == httpx.codes.OK:
-        num_page = int(r.json()['totalCount']) // 100 + 1
+        num_page = -(-int(r.json()["totalCount"]) // 100)
         rate_limit = AsyncLimiter(
             async_max_rate,
             async_time_period
         )
 
-        async with httpx.AsyncClient(
-            headers=headers,
-            proxies=proxy,
-            timeout=timeout
-        ) as client:
-            tasks = [
-                asyncio.create_task(
-                    fetch_data_id(
-                        press_code,
-                        str(i+1),
-                        client,
-                        begin_date,
-                        end_date,
-                        rate_limit
-                    )
+        with tqdm(
+            total=num_page,
+            desc=f"fetch data id from {proxy}:{begin_date}/{end_date}",
+            position=process_id
+        ) as pbar:
+
+            async def tracked(start_no: str) -> List[str]:
+                res = await fetch_data_id(
+                    press_code,
+                    start_no,
+                    client,
+                    begin_date,
+                    end_date,
+                    rate_limit,
+                    failed
                 )
-                for i in range(num_page)
-            ]
+                pbar.update()
+                return res
 
-            return await tqdm_asyncio.gather(
-                *tasks,
-                desc=f"fetch data id from {proxy}:{begin_date}/{end_date}",
-                position=process_id
-            )
+            async with asyncio.TaskGroup() as tg:
+                tasks = [
+                    tg.create_task(tracked(str(i+1)))
+                    for i in range(num_page)
+                ]
+
+        return [task.result() for task in tasks]
     else:
         logger.error("fail to identify the number of page")
         sys.exit
@@ -159,50 +178,88 @@ def mp_fetch_data_id(press_code: List[str],
                      end_date: str,
                      proxy: str,
                      process_id: int,
-                     ) -> List[str]:
+                     ) -> str:
+    """Fetch the data id of a period into a `NewsIdStore` file.
 
+    Only the path of the file is sent back to the parent process.
+    """
     logger.remove()
     logger.add(log_file, level='INFO', enqueue=True)
 
     target_file = (
         target_dir
         /
-        (begin_date + '_' + end_date + '.txt')
+        (begin_date + '_' + end_date + '.ids')
     )
+    legacy_file = target_file.with_suffix('.txt')
 
-    if not target_file.is_file():
-        nest_asyncio.apply()
-        data_id_list_item = list(itertools.chain.from_iterable([
-            item
-            for item in asyncio.run(
-                async_fetch_data_id(
-                    press_code,
-                    headers,
-                    timeout,
-                    async_max_rate,
-                    async_time_period,
-                    begin_date,
-                    end_date,
-                    proxy,
-                    process_id
-                )
-            )
-            if item != ""
-        ]))
-
-        with open(target_file, 'w') as f:
-            f.writelines(
-                [id + '\n' for id in data_id_list_item]
-            )
-    else:
+    if target_file.is_file():
         logger.info(
             f"fetch data id from file: {begin_date}/{end_date}"
         )
+    elif legacy_file.is_file():
+        logger.info(
+            f"convert data id from text file: {begin_date}/{end_date}"
+        )
+        with open(legacy_file, 'r') as f:
+            NewsIdStore.from_ids(f).save(target_file)
+    else:
+        failed = []
+        NewsIdStore.from_ids(
+            itertools.chain.from_iterable(
+                get_engine().run(
+                    async_fetch_data_id(
+                        press_code,
+                        headers,
+                        timeout,
+                        async_max_rate,
+                        async_time_period,
+                        begin_date,
+                        end_date,
+                        proxy,
+                        process_id,
+                        failed
+                    )
+                )
+            )
+        ).save(target_file)
+        save_dead_letters(
+            target_file.with_suffix('.dead'),
+            failed
+        )
 
-        with open(target_file, 'r')as f:
-            data_id_list_item = f.readlines()
+    return str(target_file)
 
-    return data_id_list_item
+
+def dead_letter(kind: str,
+                key: str,
+                target: Dict,
+                error: str,
+                status: Optional[int] = None
+                ) -> Dict:
+    """Failure in the format read by `DeadLetters.import_jsonl`."""
+    return {
+        'kind': kind,
+        'key': key,
+        'target': target,
+        'error': error,
+        'status': status
+    }
+
+
+def save_dead_letters(file: Path, failed: List[Dict]) -> None:
+    if len(failed) > 0:
+        logger.warning(f"{len(failed)} failures written to {file}")
+        with open(file, 'ab') as f:
+            for item in failed:
+                f.write(orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE))
+
+
+def init_worker(lock, use_uvloop: bool) -> None:
+    """Pool initializer: shared tqdm lock and the event loop kept by the
+    process for every period it runs."""
+    tqdm.set_lock(lock)
+    init_engine(use_uvloop)
 
 
 def query_string(data_id: str) -> Dict[str, str]:
@@ -227,7 +284,7 @@ async def fetch_news(data_id: str,
                      limiter: AsyncLimiter,
                      begin_date: str,
                      end_date: str
-                     ) -> Dict[str, str]:
+                     ) -> Article | Dict:
     request_url = "https://www.bigkinds.or.kr/news/detailView.do"
 
     async with limiter:
@@ -250,20 +307,38 @@ async def fetch_news(data_id: str,
                         f"{begin_date}/{end_date}: {e}, re-send the request")
 
         if r.status_code == httpx.codes.OK:
-            detail = r.json()['detail']
+            return decode_detail(r.content, data_id)
+        else:
             return {
-                'date': detail['DATE'],
-                'title': detail['TITLE'],
-                'content': detail['CONTENT']
-                # 'location': response['TMS_NE_LOCATION'].split('\n'),
-                # 'category': response['CATEGORY_MAIN'].split('>'),
-                # 'relevant': self.__parse_sim(response['TMS_SIMILARITY'])
+                'news_id': data_id,
+                'error': 'HTTPStatus',
+                'status': r.status_code
             }
-        else:
-            return {"": ""}
 
 
-async def async_fetch_news(data_id_list: List[str],
+def load_committed(tmp_file: Path) -> Set[str]:
+    """Collect the news id already committed to an interrupted temp file.
+
+    A partially written last line is truncated so that appending can resume
+    right after the last complete record.
+    """
+    committed = set()
+    if not tmp_file.exists():
+        return committed
+
+    with open(tmp_file, 'r+b') as f:
+        valid = 0
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            committed.add(orjson.loads(line)['news_id'])
+            valid += len(line)
+        f.truncate(valid)
+
+    return committed
+
+
+async def async_fetch_news(data_id_list: Iterable[str],
                            headers: Dict[str, str],
                            timeout: int,
                            async_max_rate: int,
@@ -271,36 +346,77 @@ async def async_fetch_news(data_id_list: List[str],
                            begin_date: str,
                            end_date: str,
                            proxy: str,
-                           process_id: int
-                           ):
+                           process_id: int,
+                           tmp_file: Path,
+                           num_workers: int = 50,
+                           fsync_every: int = 500,
+                           failed: Optional[List[Dict]] = None
+                           ) -> int:
+    """Fetch the news with a fixed pool of workers, appending every result
+    to `tmp_file` as soon as it completes.
+
+    Returns:
+        the number of news appended to `tmp_file`
+    """
     rate_limit = AsyncLimiter(
         async_max_rate,
         async_time_period
     )
-
-    async with httpx.AsyncClient(
-        headers=headers,
-        proxies=proxy,
-        timeout=timeout
-    ) as client:
-        tasks = [
-            asyncio.create_task(
-                fetch_news(
+    committed = load_committed(tmp_file)
+    if len(committed) > 0:
+        logger.info(f"resume {begin_date}/{end_date} from {len(committed)} news")
+
+    data_id_iter = (
+        id
+        for id in map(str.strip, data_id_list)
+        if id != "" and id not in committed
+    )
+    n_written = 0
+
+    client = get_engine().client(proxy, timeout, headers)
+    with open(tmp_file, 'ab') as f, tqdm(
+        desc=f"fetch news from {proxy}: {begin_date}/{end_date}",
+        position=process_id,
+        total=(
+            len(data_id_list)
+            if hasattr(data_id_list, '__len__')
+            else
+            None
+        ),
+        initial=len(committed)
+    ) as pbar:
+
+        async def worker() -> None:
+            nonlocal n_written
+            for id in data_id_iter:
+                news = await fetch_news(
                     id,
                     client,
                     rate_limit,
                     begin_date,
                     end_date
                 )
-            )
-            for id in data_id_list
-        ]
+                pbar.update()
+                if not isinstance(news, Article):
+                    if failed is not None:
+                        failed.append(news)
+                    continue
 
-        return await tqdm_asyncio.gather(
-            *tasks,
-            desc=f"fetch news from {proxy}: {begin_date}/{end_date}",
-            position=process_id
-        )
+                f.write(news.to_json())
+                n_written += 1
+                if n_written % fsync_every == 0:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+        # a failing worker cancels the others, the temp file keeps their work
+        async with asyncio.TaskGroup() as tg:
+            for _ in range(num_workers):
+                tg.create_task(worker())
+
+        f.flush()
+        os.fsync(f.fileno())
+
+    return n_written
 
 
 def mp_fetch_news(press: str,
@@ -310,7 +426,7 @@ def mp_fetch_news(press: str,
                   timeout: int,
                   async_max_rate: int,
                   async_time_period: int,
-                  data_id_list: List[str],
+                  id_store_name: str,
                   begin_date: str,
                   end_date: str,
                   proxy: str,
@@ -325,29 +441,52 @@ def mp_fetch_news(press: str,
         (press + '_' + begin_date + '_' + end_date + '.jsonl')
     )
     if not target_file.exists():
-        nest_asyncio.apply()
-        news_list = [
-            item
-            for item in asyncio.run(
-                async_fetch_news(
-                    data_id_list,
-                    headers,
-                    timeout,
-                    async_max_rate,
-                    async_time_period,
-                    begin_date,
-                    end_date,
-                    proxy,
-                    process_id
-                )
+        # the period is only visible under `target_file` once it's complete
+        tmp_file = target_file.with_suffix('.jsonl.tmp')
+        id_store = NewsIdStore.attach(id_store_name)
+
+        failed = []
+        get_engine().run(
+            async_fetch_news(
+                id_store.range(begin_date, end_date),
+                headers,
+                timeout,
+                async_max_rate,
+                async_time_period,
+                begin_date,
+                end_date,
+                proxy,
+                process_id,
+                tmp_file,
+                failed=failed
             )
-            if item != {"": ""}
-        ]
-        news_list.reverse()
-
-        with open(target_file, 'wb') as f:
-            for news in news_list:
-                f.write(orjson.dumps(news, option=orjson.OPT_APPEND_NEWLINE))
+        )
+        id_store.close()
+        save_dead_letters(
+            target_file.with_suffix('.dead'),
+            [
+                dead_letter(
+                    'news',
+                    news['news_id'],
+                    {
+                        'press': press,
+                        'begin': '-'.join((
+                            news['news_id'][9:13],
+                            news['news_id'][13:15],
+                            news['news_id'][15:17]
+                        )),
+                        'layout': 'daily',
+                        'db_name': None,
+                        'collection_name': None,
+                        'time_series': False
+                    },
+                    news['error'],
+                    news['status']
+                )
+                for news in failed
+            ]
+        )
+        os.replace(tmp_file, target_file)
     else:
         logger.info(f"fetch news from file: {begin_date}/{end_date}")
 
@@ -361,9 +500,11 @@ class HttpxScraper(Scraper):
                  proxy: Optional[str | ListConfig] = None,
                  async_max_rate: Optional[int] = None,
                  async_time_period: Optional[int] = None,
-                 output_dir: Optional[Path] = None
+                 output_dir: Optional[Path] = None,
+                 use_uvloop: bool = False
                  ) -> None:
         super().__init__(begin, end, interval, timeout, output_dir)
+        self.use_uvloop = use_uvloop
 
         self.proxy = (
             proxy if isinstance(proxy, str) else list(proxy)
@@ -516,7 +657,7 @@ class HttpxScraper(Scraper):
 
     def collect_data_id(self,
                         press: str | List[str],
-                        ) -> List[List[str]]:
+                        ) -> NewsIdStore:
         logging.getLogger("httpx").setLevel(logging.WARNING)
         self.check_proxy()
         self.schedule_proxy()
@@ -578,24 +719,31 @@ class HttpxScraper(Scraper):
 
         with Pool(
             processes=self.num_mp_process,
-            initializer=tqdm.set_lock,
-            initargs=(RLock(),)
+            initializer=init_worker,
+            initargs=(RLock(), self.use_uvloop)
         ) as p:
-            data_id_list = p.starmap(func, argument_list)
+            id_files = p.starmap(func, argument_list)
 
         logger.info("finish fetch the data id")
 
-        return data_id_list
+        stores = [NewsIdStore.open(file) for file in id_files]
+        id_store = NewsIdStore.merge(stores)
+        for store in stores:
+            store.close()
+
+        return id_store
 
     def collect_news(self,
                      press: str,
-                     data_id_list_cluster: List[List[str]]
+                     id_store: NewsIdStore,
+                     index: bool = False
                      ) -> None:
-        self.id_check = {
-            data_id: 0
-            for data_id in itertools.chain.from_iterable(data_id_list_cluster)
-        }
+        """Fetch the news of every period and merge them into the monthly
+        `<press>_<year>_<month>.jsonl`.
 
+        With `index`, a sidecar `.jsonl.idx` mapping every news id to its
+        byte range is written along, see `bigkinds_loader.jsonl_index.JsonlReader`.
+        """
         logging.getLogger("httpx").setLevel(logging.WARNING)
 
         log_file = Path('log') / 'collect_news.log'
@@ -623,9 +771,11 @@ class HttpxScraper(Scraper):
             self.async_max_rate,
             self.async_time_period
         )
+        # workers attach to the ids by name instead of receiving them pickled
+        shm = id_store.share()
         argument_list = [
             (
-                data_id_list_cluster[i],
+                shm.name,
                 self.period['begin'][i],
                 self.period['end'][i],
                 self.scheduled_proxy[i],
@@ -638,10 +788,14 @@ class HttpxScraper(Scraper):
 
         with Pool(
             processes=self.num_mp_process,
-            initializer=tqdm.set_lock,
-            initargs=(RLock(),)
+            initializer=init_worker,
+            initargs=(RLock(), self.use_uvloop)
         ) as p:
-            p.starmap(func, argument_list)
+            try:
+                p.starmap(func, argument_list)
+            finally:
+                shm.close()
+                shm.unlink()
 
         logger.info("finish fetch the data id")
 
@@ -656,14 +810,18 @@ class HttpxScraper(Scraper):
                 f'{self.add_zero(self.begin_date.month)}.jsonl'
             ))
         )
+        entries = []
         with open(output_file, 'wb') as f1:
-            attend_list = []
-            for file in sorted(list(target_dir.glob('*'))):
-                attend_list += [
-                    orjson.loads(line)
-                    for line in open(file, 'r')
-                    if line != '\n'
-                ]
-
-            for item in attend_list:
-                f1.write(orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE))
+            for file in sorted(list(target_dir.glob('*.jsonl'))):
+                with open(file, 'rb') as f2:
+                    for line in f2:
+                        if line == b'\n':
+                            continue
+                        if index:
+                            entries.append(
+                                (orjson.loads(line)['news_id'], f1.tell(), len(line))
+                            )
+                        f1.write(line)
+
+        if index:
+            save_index(output_file, entries)
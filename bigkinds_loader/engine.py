@@ -0,0 +1,110 @@
+import asyncio
+import atexit
+import httpx
+from loguru import logger
+import os
+from pymongo import MongoClient
+from typing import Any, Coroutine, Dict, Optional, Tuple, TypeVar
+
+from .api import HEADERS
+
+
+T = TypeVar('T')
+
+
+def _loop_factory(use_uvloop: bool):
+    if use_uvloop:
+        try:
+            import uvloop
+            return uvloop.new_event_loop
+        except ImportError:
+            logger.warning('uvloop is not installed, use the default event loop')
+    return None
+
+
+class Engine:
+    """Event loop and http clients living as long as the (worker) process.
+
+    Every shard is run with `run` on the same loop instead of building a new
+    loop with `asyncio.run` and a new `httpx.AsyncClient` each time, and
+    `client` hands out the connection pool of a proxy to every shard using it,
+    `mongo` the mongodb client of the process.
+
+    Args:
+        `use_uvloop`: run the loop on uvloop if it's installed
+    """
+    def __init__(self, use_uvloop: bool = False) -> None:
+        self.runner = asyncio.Runner(loop_factory=_loop_factory(use_uvloop))
+        self.clients: Dict[Tuple, httpx.AsyncClient] = {}
+        self.mongo_clients: Dict[str, MongoClient] = {}
+
+
+    def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        return self.runner.run(coro)
+
+
+    def client(self,
+               proxy: Optional[str]             = None,
+               timeout: float                   = 300,
+               headers: Optional[Dict[str, str]] = None
+              ) -> httpx.AsyncClient:
+        """Shared client of a proxy, don't close it."""
+        headers = HEADERS if headers is None else headers
+        key = (proxy, timeout, tuple(sorted(headers.items())))
+        if key not in self.clients:
+            self.clients[key] = httpx.AsyncClient(
+                headers=headers,
+                proxies=proxy,
+                timeout=timeout
+            )
+        return self.clients[key]
+
+
+    def mongo(self, conn_str: Optional[str] = None) -> MongoClient:
+        """Shared mongodb client, default to the one connected to `CONN_STR`."""
+        conn_str = os.environ['CONN_STR'] if conn_str is None else conn_str
+        if conn_str not in self.mongo_clients:
+            self.mongo_clients[conn_str] = MongoClient(conn_str)
+        return self.mongo_clients[conn_str]
+
+
+    def close(self) -> None:
+        async def aclose() -> None:
+            for client in self.clients.values():
+                await client.aclose()
+
+        if len(self.clients) > 0:
+            self.run(aclose())
+            self.clients.clear()
+        for client in self.mongo_clients.values():
+            client.close()
+        self.mongo_clients.clear()
+        self.runner.close()
+
+
+_engine: Optional[Engine] = None
+_engine_pid: Optional[int] = None
+
+
+def init_engine(use_uvloop: bool = False) -> Engine:
+    """Create the engine of the current process, also usable as the
+    initializer of a `multiprocessing.Pool`.
+
+    An engine inherited through `fork` is never reused, its loop belongs to
+    the parent process.
+    """
+    global _engine, _engine_pid
+    if _engine is None or _engine_pid != os.getpid():
+        _engine = Engine(use_uvloop)
+        _engine_pid = os.getpid()
+        atexit.register(_engine.close)
+    return _engine
+
+
+def get_engine() -> Engine:
+    return (
+        _engine
+        if _engine is not None and _engine_pid == os.getpid()
+        else
+        init_engine()
+    )
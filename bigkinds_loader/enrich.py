@@ -0,0 +1,56 @@
+from typing import Dict, List
+
+
+# fields of the detail payload kept aside by `Scraper.get_news_instance`
+RAW_FIELDS = ('TMS_SIMILARITY', 'TMS_NE_LOCATION', 'CATEGORY_MAIN')
+
+
+def parse_similarity(sim: str) -> Dict[str, float]:
+    """`경제^12.5 OR 금리^3.2` -> {'경제': 12.5, '금리': 3.2}"""
+    res = {}
+    for word_score in sim.split(' OR '):
+        word, _, score = word_score.strip().rpartition('^')
+        if word == '':
+            continue
+        try:
+            res[word] = float(score)
+        except ValueError:
+            continue
+
+    return res
+
+
+def parse_locations(loc: str) -> List[str]:
+    """Newline separated named entities -> list of unique locations."""
+    return list(dict.fromkeys(
+        item.strip()
+        for item in loc.split('\n')
+        if item.strip() != ''
+    ))
+
+
+def parse_categories(cat: str) -> List[List[str]]:
+    """`경제>금융_재테크|정치>국회_정당` -> [['경제', '금융_재테크'], ['정치', '국회_정당']]"""
+    return [
+        [level.strip() for level in path.split('>') if level.strip() != '']
+        for path in cat.split('|')
+        if path.strip() != ''
+    ]
+
+
+def enrich_batch(batch: List[Dict]) -> List[Dict]:
+    """Replace the `raw` payload fields of every document by structured ones.
+
+    The term scores are stored as a list of {term, score} rather than a
+    mapping since terms may contain characters mongodb forbids in keys.
+    """
+    for doc in batch:
+        raw = doc.pop('raw', {})
+        doc['similarity'] = [
+            {'term': term, 'score': score}
+            for term, score in parse_similarity(raw.get('TMS_SIMILARITY') or '').items()
+        ]
+        doc['locations'] = parse_locations(raw.get('TMS_NE_LOCATION') or '')
+        doc['categories'] = parse_categories(raw.get('CATEGORY_MAIN') or '')
+
+    return batch
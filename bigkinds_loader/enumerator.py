@@ -0,0 +1,339 @@
+from aiolimiter import AsyncLimiter
+import asyncio
+from collections import defaultdict
+import httpx
+from loguru import logger
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+from .api import SEARCH_URL, load_press_code, search_payload
+from .engine import get_engine
+from .id_store import NewsIdStore
+
+if TYPE_CHECKING:
+    from .dead_letter import DeadLetters
+
+
+def id_path(id_dir: Path | str, press: str, begin: str, end: str) -> Path:
+    """File of the news id of a press and period enumerated through `search.do`."""
+    return Path(id_dir) / press / begin.split('-')[0] / f'{begin}_{end}.ids'
+
+
+async def fetch_page(client: httpx.AsyncClient,
+                     limiter: AsyncLimiter,
+                     press_codes: List[str],
+                     begin: str,
+                     end: str,
+                     page: int,
+                     page_size: int,
+                     max_retry: int                 = 5,
+                     failed: Optional[List[Dict]]   = None
+                    ) -> Optional[Dict]:
+    """A page of search results, None once every retry failed.
+
+    Args:
+        `failed`: the failed page, its last error class and status are appended to it
+    """
+    error, status = '', None
+    for retry in range(max_retry):
+        async with limiter:
+            try:
+                r = await client.post(
+                    SEARCH_URL,
+                    json=search_payload(press_codes, begin, end, page, page_size)
+                )
+                if r.status_code == httpx.codes.OK:
+                    return r.json()
+                error, status = 'HTTPStatus', r.status_code
+                logger.info(f'{begin}/{end} page {page}: status {r.status_code}')
+            except httpx.HTTPError as e:
+                error, status = type(e).__name__, None
+                logger.info(f'{begin}/{end} page {page}: {e!r}, re-send the request')
+        await asyncio.sleep(2 ** retry)
+
+    logger.error(f'fail to fetch {begin}/{end} page {page} of {press_codes}')
+    if failed is not None:
+        failed.append({
+            'press_codes': press_codes,
+            'begin': begin,
+            'end': end,
+            'page': page,
+            'page_size': page_size,
+            'error': error,
+            'status': status
+        })
+    return None
+
+
+async def fetch_span(client: httpx.AsyncClient,
+                     limiter: AsyncLimiter,
+                     press_codes: List[str],
+                     begin: str,
+                     end: str,
+                     page: int,
+                     page_size: int,
+                     min_page_size: int            = 10,
+                     failed: Optional[List[Dict]]  = None
+                    ) -> Tuple[List[Dict], int]:
+    """Results of a page of `page_size`, refetched as `k` smaller pages
+    covering the same offsets (`(page - 1) * k + 1` to `page * k`) when the
+    large page keeps failing, down to `min_page_size`.
+
+    Returns:
+        the results and the `totalCount` of the search, -1 if every request
+        failed
+    """
+    k = next(
+        (k for k in (10, 5, 2) if page_size % k == 0 and page_size // k >= min_page_size),
+        None
+    )
+    data = await fetch_page(
+        client,
+        limiter,
+        press_codes,
+        begin,
+        end,
+        page,
+        page_size,
+        max_retry=5 if k is None else 2,
+        failed=failed if k is None else None
+    )
+    if data is not None:
+        return data['resultList'], int(data['totalCount'])
+    if k is None:
+        return [], -1
+
+    logger.info(f'{begin}/{end} page {page}: retry as {k} pages of {page_size // k}')
+    async with asyncio.TaskGroup() as tg:
+        tasks = [
+            tg.create_task(fetch_span(
+                client,
+                limiter,
+                press_codes,
+                begin,
+                end,
+                (page - 1) * k + i + 1,
+                page_size // k,
+                min_page_size,
+                failed
+            ))
+            for i in range(k)
+        ]
+    results = [task.result() for task in tasks]
+    return (
+        [item for items, _ in results for item in items],
+        max(total for _, total in results)
+    )
+
+
+async def enumerate_group(client: httpx.AsyncClient,
+                          limiter: AsyncLimiter,
+                          press_codes: List[str],
+                          begin: str,
+                          end: str,
+                          page_size: int                = 100,
+                          failed: Optional[List[Dict]]  = None,
+                          min_page_size: int            = 10
+                         ) -> Tuple[Dict[str, List[str]], int, bool]:
+    """Page the search once for a group of presses and split the news id by
+    press code (the prefix of the news id).
+
+    The number of pages is known from the `totalCount` of the first page
+    (itself split into smaller pages when it keeps failing), the others are
+    fetched concurrently (paced by `limiter`), and the number of distinct
+    news id collected is checked against `totalCount`.
+
+    Returns:
+        the news id of every press code, the `totalCount` of the group (-1 if
+        the first page failed) and whether the enumeration is complete: every
+        page was fetched and as many news id as `totalCount` were collected
+    """
+    ids = defaultdict(list)
+    group_failed = []
+    first, total = await fetch_span(
+        client,
+        limiter,
+        press_codes,
+        begin,
+        end,
+        1,
+        page_size,
+        min_page_size,
+        group_failed
+    )
+    if total < 0:
+        if failed is not None:
+            failed.extend(group_failed)
+        return ids, -1, False
+
+    n_pages = -(-total // page_size)
+    async with asyncio.TaskGroup() as tg:
+        tasks = [
+            tg.create_task(fetch_span(
+                client,
+                limiter,
+                press_codes,
+                begin,
+                end,
+                page,
+                page_size,
+                min_page_size,
+                group_failed
+            ))
+            for page in range(2, n_pages + 1)
+        ]
+    if failed is not None:
+        failed.extend(group_failed)
+
+    # overlapping pages (articles published while paging) yield duplicates
+    seen = set()
+    for items in [first, *(task.result()[0] for task in tasks)]:
+        for item in items:
+            news_id = item['NEWS_ID']
+            if news_id not in seen:
+                seen.add(news_id)
+                ids[news_id.partition('.')[0]].append(news_id)
+
+    # e.g. results shifting between pages while paging: the missing news
+    # aren't tied to a page, so the period is enumerated again rather than
+    # dead-lettered
+    if len(seen) != total:
+        logger.error(
+            f'{begin}/{end} {press_codes}: {len(seen)} news id collected, '
+            f'{total} expected from totalCount'
+        )
+    return ids, total, len(group_failed) == 0 and len(seen) == total
+
+
+async def async_enumerate(press: List[str],
+                          begin: str,
+                          end: str,
+                          group_size: Optional[int],
+                          page_size: int,
+                          max_rate: int,
+                          time_period: float,
+                          timeout: float,
+                          proxy: Optional[str],
+                          failed: Optional[List[Dict]] = None,
+                          min_page_size: int           = 10
+                         ) -> Tuple[Dict[str, List[str]], Set[str]]:
+    """The news id of every press and the presses whose enumeration is incomplete."""
+    press2code = load_press_code()
+    code2press = {press2code[p]: p for p in press}
+    codes = list(code2press)
+    group_size = len(codes) if group_size is None else group_size
+    groups = [codes[i:i+group_size] for i in range(0, len(codes), group_size)]
+
+    limiter = AsyncLimiter(max_rate, time_period)
+    client = get_engine().client(proxy, timeout)
+    async with asyncio.TaskGroup() as tg:
+        tasks = [
+            tg.create_task(enumerate_group(
+                client,
+                limiter,
+                group,
+                begin,
+                end,
+                page_size,
+                failed,
+                min_page_size
+            ))
+            for group in groups
+        ]
+
+    res = {p: [] for p in press}
+    incomplete = set()
+    for group, (ids, _, complete) in zip(groups, (task.result() for task in tasks)):
+        if not complete:
+            incomplete.update(code2press[code] for code in group)
+        for code, news_ids in ids.items():
+            if code in code2press:
+                res[code2press[code]].extend(news_ids)
+    return res, incomplete
+
+
+def enumerate_ids(press: str | List[str],
+                  begin: str,
+                  end: str,
+                  id_dir: Path | str                    = 'env/data_id',
+                  combined: bool                        = True,
+                  group_size: Optional[int]             = None,
+                  page_size: int                        = 100,
+                  min_page_size: int                    = 10,
+                  max_rate: int                         = 100,
+                  time_period: float                    = 3,
+                  timeout: float                        = 300,
+                  proxy: Optional[str]                  = None,
+                  dead_letters: Optional['DeadLetters'] = None,
+                  target: Optional[Dict]                = None
+                 ) -> Dict[str, NewsIdStore]:
+    """Enumerate the news id of several presses and store them per press.
+
+    With `combined`, the search is paged once for every group of
+    `group_size` presses (default to all of them) instead of once per press,
+    which saves the sparse page walks of low-volume presses; results are
+    split back per press with the provider code prefixing the news id.
+
+    Pages are fetched concurrently once `totalCount` is known, a page failing
+    at `page_size` (the first one included) is refetched as smaller pages
+    over the same offsets, down to `min_page_size`.
+
+    Pages failing every retry are recorded in `dead_letters`, `target`
+    (layout, db_name, ...) tells `redrive` where their news go.
+
+    Returns:
+        the id store of every press, saved under `id_path(id_dir, press, begin,
+        end)` only if its enumeration is complete (no failed page and as many
+        news id as `totalCount`): a store missing news would be reused as is
+        by `get_news_batch`, so the period is enumerated again next time
+        instead
+    """
+    press = [press] if isinstance(press, str) else list(press)
+    failed = []
+    ids, incomplete = get_engine().run(async_enumerate(
+        press,
+        begin,
+        end,
+        group_size if combined else 1,
+        page_size,
+        max_rate,
+        time_period,
+        timeout,
+        proxy,
+        failed,
+        min_page_size
+    ))
+
+    if dead_letters is not None and len(failed) > 0:
+        press2code = load_press_code()
+        code2press = {press2code[p]: p for p in press}
+        for page in failed:
+            dead_letters.add_search(
+                page.pop('press_codes'),
+                page.pop('begin'),
+                page.pop('end'),
+                page.pop('page'),
+                page.pop('page_size'),
+                {
+                    'code2press': code2press,
+                    'id_dir': str(id_dir),
+                    'news_target': {} if target is None else target
+                },
+                **page
+            )
+        logger.warning(f'{len(failed)} search pages sent to the dead letters')
+
+    res = {}
+    for p, news_ids in ids.items():
+        store = NewsIdStore.from_ids(news_ids)
+        res[p] = store
+        if p in incomplete:
+            logger.warning(f'{p} {begin}/{end}: {len(store)} news id, incomplete and not saved')
+            continue
+
+        file = id_path(id_dir, p, begin, end)
+        file.parent.mkdir(parents=True, exist_ok=True)
+        store.save(file)
+        logger.info(f'{p} {begin}/{end}: {len(store)} news id')
+
+    return res
@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from .layout import parse_date
+
+
+_WORD = re.compile(r'\w+')
+_CJK = re.compile(r'[\u1100-\u11ff\u3130-\u318f\uac00-\ud7af\u4e00-\u9fff]')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS news (
+    rowid INTEGER PRIMARY KEY,
+    news_id TEXT NOT NULL UNIQUE,
+    press TEXT,
+    date TEXT,
+    title TEXT
+);
+CREATE INDEX IF NOT EXISTS news_press_date ON news (press, date);
+CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5(
+    title,
+    content,
+    tokenize = 'unicode61 remove_diacritics 0'
+);
+"""
+
+
+def ngrams(text: str) -> List[str]:
+    """Tokens of the index: Hangul/CJK words as overlapping character bigrams,
+    other words as they are.
+
+    `한국은행` -> ['한국', '국은', '은행'], so that searching `은행` matches it
+    without a morphological analyzer.
+    """
+    tokens = []
+    for word in _WORD.findall(text):
+        if _CJK.search(word) is None or len(word) < 3:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i+2] for i in range(len(word) - 1))
+    return tokens
+
+
+def to_match(query: str) -> str:
+    """Every word of the query as a phrase of its n-grams, all of them required."""
+    return ' AND '.join(
+        '"' + ' '.join(ngrams(word)) + '"'
+        for word in _WORD.findall(query)
+    )
+
+
+class FullTextIndex:
+    """Local SQLite FTS5 index of the articles ranked with BM25.
+
+    Korean has no spaces between a noun and its particles, so text is indexed
+    as character bigrams (see `ngrams`) and queries are matched as phrases
+    of bigrams, i.e. substring search. `add` upserts by news id and can be
+    used as an `on_commit` callback of `MongoWriter`, the connection being
+    shareable with the writer thread.
+
+    Args:
+        `path`: SQLite database file
+    """
+    def __init__(self, path: Path | str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+        self.lock = threading.Lock()
+
+
+    def add(self, docs: Iterable[Dict], press: Optional[str] = None) -> None:
+        """Index (or re-index) a batch of articles in one transaction."""
+        with self.lock, self.conn:
+            for doc in docs:
+                date = doc.get('date')
+                if not isinstance(date, datetime):
+                    date = parse_date(date or '', doc.get('news_id'))
+
+                rowid = self.conn.execute(
+                    """
+                    INSERT INTO news (news_id, press, date, title) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (news_id) DO UPDATE SET
+                        press = excluded.press, date = excluded.date, title = excluded.title
+                    RETURNING rowid
+                    """,
+                    (
+                        doc['news_id'],
+                        doc.get('press', press),
+                        date.isoformat(sep=' ') if date is not None else None,
+                        doc.get('title', '')
+                    )
+                ).fetchone()[0]
+
+                self.conn.execute('DELETE FROM news_fts WHERE rowid = ?', (rowid,))
+                self.conn.execute(
+                    'INSERT INTO news_fts (rowid, title, content) VALUES (?, ?, ?)',
+                    (
+                        rowid,
+                        ' '.join(ngrams(doc.get('title') or '')),
+                        ' '.join(ngrams(doc.get('clean_content') or doc.get('content') or ''))
+                    )
+                )
+
+
+    def search(self,
+               query: str,
+               press: Optional[str] = None,
+               begin: Optional[str] = None,
+               end: Optional[str]   = None,
+               limit: int           = 20,
+               title_weight: float  = 2.
+              ) -> List[Dict]:
+        """Articles matching every word of `query`, best BM25 score first.
+
+        Args:
+            `query`:        words to search
+            `press`:        only the articles of this press
+            `begin`:        only the articles published from this date
+            `end`:          only the articles published until this date (included)
+            `limit`:        maximum number of results
+            `title_weight`: BM25 weight of the title relative to the content
+        """
+        match = to_match(query)
+        if match == '':
+            return []
+
+        sql = """
+            SELECT n.news_id, n.press, n.date, n.title, bm25(news_fts, ?, 1.0) AS score
+            FROM news_fts JOIN news n ON n.rowid = news_fts.rowid
+            WHERE news_fts MATCH ?
+        """
+        params = [title_weight, match]
+        if press is not None:
+            sql += ' AND n.press = ?'
+            params.append(press)
+        if begin is not None:
+            sql += ' AND n.date >= ?'
+            params.append(begin)
+        if end is not None:
+            sql += ' AND n.date < ?'
+            params.append(str((datetime.strptime(end, '%Y-%m-%d') + timedelta(1)).date()))
+        sql += ' ORDER BY score LIMIT ?'
+        params.append(limit)
+
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+
+        return [
+            dict(zip(('news_id', 'press', 'date', 'title', 'score'), row))
+            for row in rows
+        ]
+
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
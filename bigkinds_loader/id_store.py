@@ -0,0 +1,233 @@
+from array import array
+from bisect import bisect_left
+import heapq
+import mmap
+from multiprocessing import shared_memory
+from pathlib import Path
+import struct
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+
+_MAGIC = b'BKID'
+_VERSION = 1
+_HEADER = struct.Struct('<4sIQ')
+_ITEMSIZE = 4
+
+assert array('I').itemsize == _ITEMSIZE
+
+
+def encode_id(news_id: str) -> Tuple[int, int, int]:
+    """Split a news id like `02100601.20240103103252001` into
+    (press code, yyyymmdd, HHMMSS + 3 digits sequence) integers."""
+    news_id = news_id.strip()
+    code, _, stamp = news_id.partition('.')
+    if len(code) != 8 or len(stamp) != 17 or not (code + stamp).isdigit():
+        raise ValueError(f'invalid news id: {news_id!r}')
+
+    return int(code), int(stamp[:8]), int(stamp[8:])
+
+
+def decode_id(press: int, date: int, seq: int) -> str:
+    return f'{press:08d}.{date:08d}{seq:09d}'
+
+
+def _date_key(d: str) -> int:
+    """`2024-01-03` -> 20240103"""
+    return int(d.replace('-', ''))
+
+
+class _Keys:
+    """Sequence view of the sorted (press, date, seq) keys, used by bisect."""
+    def __init__(self, store: 'NewsIdStore') -> None:
+        self.store = store
+
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+
+    def __getitem__(self, i: int) -> Tuple[int, int, int]:
+        return self.store.press[i], self.store.date[i], self.store.seq[i]
+
+
+class IdRange:
+    """The news id of a `NewsIdStore` lying in some index spans."""
+    def __init__(self, store: 'NewsIdStore', spans: List[Tuple[int, int]]) -> None:
+        self.store = store
+        self.spans = spans
+
+
+    def __len__(self) -> int:
+        return sum(hi - lo for lo, hi in self.spans)
+
+
+    def __iter__(self) -> Iterator[str]:
+        press, date, seq = self.store.press, self.store.date, self.store.seq
+        for lo, hi in self.spans:
+            for i in range(lo, hi):
+                yield decode_id(press[i], date[i], seq[i])
+
+
+class NewsIdStore:
+    """Sorted, compact set of news id.
+
+    Every id is kept as three uint32 (press code, date, sequence), 12 bytes
+    per id instead of a python string, in one contiguous buffer which can be
+    a file mapped with `mmap` or a block of shared memory. Worker processes
+    attach to the shared block by name, so nothing is pickled.
+
+    Layout: 16 bytes header (magic, version, count) followed by the press,
+    date and sequence arrays.
+    """
+    def __init__(self, buffer) -> None:
+        self._buffer = buffer
+        view = memoryview(buffer)
+        magic, version, count = _HEADER.unpack_from(view)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError('not a news id store')
+
+        # shared memory blocks may be larger than requested, rely on `count`
+        self._view = view
+        self._n = count
+        size = self._n * _ITEMSIZE
+        offset = _HEADER.size
+        self.press = view[offset:offset+size].cast('I')
+        self.date = view[offset+size:offset+2*size].cast('I')
+        self.seq = view[offset+2*size:offset+3*size].cast('I')
+        self._shm: Optional[shared_memory.SharedMemory] = None
+
+
+    @staticmethod
+    def nbytes(n: int) -> int:
+        return _HEADER.size + 3 * n * _ITEMSIZE
+
+
+    @classmethod
+    def _from_sorted(cls, keys: Iterable[Tuple[int, int, int]]) -> 'NewsIdStore':
+        """Build the store from sorted keys, skipping the duplicates."""
+        press, date, seq = array('I'), array('I'), array('I')
+        prev = None
+        for key in keys:
+            if key == prev:
+                continue
+            press.append(key[0])
+            date.append(key[1])
+            seq.append(key[2])
+            prev = key
+
+        buffer = bytearray(_HEADER.pack(_MAGIC, _VERSION, len(press)))
+        buffer += press.tobytes() + date.tobytes() + seq.tobytes()
+        return cls(buffer)
+
+
+    @classmethod
+    def from_keys(cls, keys: Iterable[Tuple[int, int, int]]) -> 'NewsIdStore':
+        return cls._from_sorted(sorted(keys))
+
+
+    @classmethod
+    def from_ids(cls, ids: Iterable[str]) -> 'NewsIdStore':
+        """Build the store from news id, ignoring blank lines."""
+        return cls.from_keys(encode_id(id) for id in ids if id.strip() != '')
+
+
+    @classmethod
+    def merge(cls, stores: Iterable['NewsIdStore']) -> 'NewsIdStore':
+        """Union of several stores.
+
+        The stores are sorted already, so they're k-way merged straight into
+        the arrays of the result: only one key per store is materialized at
+        a time, instead of a tuple per news id.
+        """
+        return cls._from_sorted(heapq.merge(
+            *(zip(store.press, store.date, store.seq) for store in stores)
+        ))
+
+
+    @classmethod
+    def open(cls, path: Path | str) -> 'NewsIdStore':
+        """Memory-map a store saved by `save`."""
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer)
+
+
+    @classmethod
+    def attach(cls, name: str) -> 'NewsIdStore':
+        """Attach to a store shared by another process through `share`."""
+        shm = shared_memory.SharedMemory(name=name)
+        store = cls(shm.buf)
+        store._shm = shm
+        return store
+
+
+    def save(self, path: Path | str) -> None:
+        path = Path(path)
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        tmp.write_bytes(self._view[:self.nbytes(self._n)])
+        tmp.replace(path)
+
+
+    def share(self) -> shared_memory.SharedMemory:
+        """Copy the store into a shared memory block.
+
+        The caller owns the block and has to `close` and `unlink` it.
+        """
+        size = self.nbytes(self._n)
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        shm.buf[:size] = self._view[:size]
+        return shm
+
+
+    def close(self) -> None:
+        for view in (self.press, self.date, self.seq, self._view):
+            view.release()
+        if self._shm is not None:
+            self._shm.close()
+        elif isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+
+    def __len__(self) -> int:
+        return self._n
+
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(IdRange(self, [(0, self._n)]))
+
+
+    def __contains__(self, news_id: str) -> bool:
+        try:
+            key = encode_id(news_id)
+        except ValueError:
+            return False
+        i = bisect_left(_Keys(self), key)
+        return i < self._n and _Keys(self)[i] == key
+
+
+    def presses(self) -> List[int]:
+        """Distinct press codes in the store."""
+        keys = _Keys(self)
+        res, i = [], 0
+        while i < self._n:
+            res.append(self.press[i])
+            i = bisect_left(keys, (self.press[i] + 1, 0, 0))
+        return res
+
+
+    def range(self,
+              begin: str,
+              end: str,
+              press: Optional[str] = None
+             ) -> IdRange:
+        """News id published in [`begin`, `end`], optionally of one press code."""
+        keys = _Keys(self)
+        lo_date, hi_date = _date_key(begin), _date_key(end)
+        spans = []
+        for code in (self.presses() if press is None else [int(press)]):
+            lo = bisect_left(keys, (code, lo_date, 0))
+            hi = bisect_left(keys, (code, hi_date + 1, 0))
+            if hi > lo:
+                spans.append((lo, hi))
+
+        return IdRange(self, spans)
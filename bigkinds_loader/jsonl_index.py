@@ -0,0 +1,190 @@
+from array import array
+from bisect import bisect_left
+import mmap
+import orjson
+from pathlib import Path
+import struct
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .id_store import _Keys, _date_key, decode_id, encode_id
+
+
+_MAGIC = b'BKJX'
+_VERSION = 1
+_HEADER = struct.Struct('<4sIQ')
+
+assert array('I').itemsize == 4 and array('Q').itemsize == 8
+
+
+def index_path(path: Path | str) -> Path:
+    """Sidecar index of a JSONL export: `x.jsonl` -> `x.jsonl.idx`"""
+    path = Path(path)
+    return path.with_suffix(path.suffix + '.idx')
+
+
+def save_index(path: Path | str,
+               entries: Iterable[Tuple[str, int, int]]
+              ) -> Path:
+    """Write the sidecar index of a JSONL export.
+
+    Layout: 16 bytes header (magic, version, count) followed by the press,
+    date and sequence uint32 arrays of the news id (as in `NewsIdStore`),
+    the uint64 byte offsets and the uint32 byte lengths of the records,
+    sorted by news id.
+
+    Args:
+        `path`:    the JSONL file
+        `entries`: (news id, offset, length) of every record
+
+    Returns:
+        the path of the index
+    """
+    press, date, seq = array('I'), array('I'), array('I')
+    offset, length = array('Q'), array('I')
+    prev = None
+    for key, off, n in sorted((encode_id(id), off, n) for id, off, n in entries):
+        if key == prev:
+            continue
+        press.append(key[0])
+        date.append(key[1])
+        seq.append(key[2])
+        offset.append(off)
+        length.append(n)
+        prev = key
+
+    file = index_path(path)
+    tmp = file.with_suffix('.idx.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, len(press)))
+        for values in (press, date, seq, offset, length):
+            values.tofile(f)
+    tmp.replace(file)
+    return file
+
+
+def build_index(path: Path | str) -> Path:
+    """Index an existing JSONL export with one pass over its lines."""
+    entries = []
+    with open(path, 'rb') as f:
+        pos = 0
+        for line in f:
+            if line.strip() != b'':
+                entries.append((orjson.loads(line)['news_id'], pos, len(line)))
+            pos += len(line)
+
+    return save_index(path, entries)
+
+
+class JsonlReader:
+    """Random access to a JSONL export through its sidecar index.
+
+    Both files are memory-mapped: a lookup is a binary search over the
+    index followed by decoding the requested line only, so reading one
+    article or one day of a multi-GB export doesn't parse the rest of it.
+    The index is built first if it is missing.
+    """
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        file = index_path(self.path)
+        if not file.exists():
+            build_index(self.path)
+
+        with open(self.path, 'rb') as f:
+            self._data = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if self.path.stat().st_size > 0
+                else
+                b''
+            )
+        with open(file, 'rb') as f:
+            self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        view = memoryview(self._index)
+        magic, version, count = _HEADER.unpack_from(view)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f'not a jsonl index: {file}')
+
+        self._n = count
+        pos = _HEADER.size
+        arrays = []
+        for code, size in (('I', 4), ('I', 4), ('I', 4), ('Q', 8), ('I', 4)):
+            arrays.append(view[pos:pos+count*size].cast(code))
+            pos += count * size
+        self.press, self.date, self.seq, self.offset, self.length = arrays
+        self._views: List[memoryview] = arrays + [view]
+
+
+    def __enter__(self) -> 'JsonlReader':
+        return self
+
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+    def close(self) -> None:
+        for view in self._views:
+            view.release()
+        self._index.close()
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+
+    def __len__(self) -> int:
+        return self._n
+
+
+    def _find(self, news_id: str) -> Optional[int]:
+        try:
+            key = encode_id(news_id)
+        except ValueError:
+            return None
+        keys = _Keys(self)
+        i = bisect_left(keys, key)
+        return i if i < self._n and keys[i] == key else None
+
+
+    def _decode(self, i: int) -> Dict:
+        off = self.offset[i]
+        return orjson.loads(self._data[off:off+self.length[i]])
+
+
+    def __contains__(self, news_id: str) -> bool:
+        return self._find(news_id) is not None
+
+
+    def get(self, news_id: str) -> Optional[Dict]:
+        i = self._find(news_id)
+        return None if i is None else self._decode(i)
+
+
+    def presses(self) -> List[int]:
+        """Distinct press codes in the export."""
+        keys = _Keys(self)
+        res, i = [], 0
+        while i < self._n:
+            res.append(self.press[i])
+            i = bisect_left(keys, (self.press[i] + 1, 0, 0))
+        return res
+
+
+    def ids(self) -> Iterator[str]:
+        for i in range(self._n):
+            yield decode_id(self.press[i], self.date[i], self.seq[i])
+
+
+    def range(self,
+              begin: str,
+              end: Optional[str]   = None,
+              press: Optional[str] = None
+             ) -> Iterator[Dict]:
+        """Records of the news published in [`begin`, `end`], optionally of
+        one press code, in news id order."""
+        end = begin if end is None else end
+        keys = _Keys(self)
+        lo_date, hi_date = _date_key(begin), _date_key(end)
+        for code in (self.presses() if press is None else [int(press)]):
+            lo = bisect_left(keys, (code, lo_date, 0))
+            hi = bisect_left(keys, (code, hi_date + 1, 0))
+            for i in range(lo, hi):
+                yield self._decode(i)
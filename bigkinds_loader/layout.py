@@ -0,0 +1,122 @@
+from datetime import datetime
+from loguru import logger
+from pymongo import ASCENDING, MongoClient
+from pymongo.collection import Collection
+from pymongo.database import Database
+from pymongo.errors import OperationFailure
+from typing import Dict, List, Literal, Optional
+
+
+Layout = Literal['daily', 'press', 'single']
+
+# collection name of the consolidated layouts
+NEWS_COLLECTION = 'news'
+# database name of the `single` layout
+SINGLE_DB = 'bigkinds'
+
+_DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d', '%Y%m%d%H%M%S', '%Y%m%d')
+
+
+def parse_date(date: str, news_id: Optional[str] = None) -> Optional[datetime]:
+    """Typed date of an article, falling back on the timestamp in the news id."""
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(date.strip(), fmt)
+        except (AttributeError, ValueError):
+            continue
+
+    if news_id is not None:
+        try:
+            return datetime.strptime(news_id.partition('.')[2][:14], '%Y%m%d%H%M%S')
+        except ValueError:
+            pass
+    return None
+
+
+def to_consolidated(doc: Dict, press: str) -> Dict:
+    """Add the `press` and a typed `date` so that days can share a collection."""
+    doc['press'] = press
+    if not isinstance(doc.get('date'), datetime):
+        date = parse_date(doc.get('date', ''), doc.get('news_id'))
+        if date is not None:
+            doc['date'] = date
+    return doc
+
+
+def daily_collections(db: Database) -> List[str]:
+    """Names of the collections of the daily layout, named after their date."""
+    res = []
+    for name in sorted(db.list_collection_names()):
+        try:
+            datetime.strptime(name, '%Y-%m-%d')
+        except ValueError:
+            continue
+        res.append(name)
+    return res
+
+
+def ensure_indexes(collection: Collection, unique: bool = True) -> None:
+    """Compound (press, date) index for range scans and a news_id index for
+    lookups, unique unless `unique` is False (time series collections don't
+    support unique indexes).
+
+    A collection created with the former non-unique news_id index, or
+    holding duplicated articles, keeps it: the conflict is logged.
+    """
+    collection.create_index([('press', ASCENDING), ('date', ASCENDING)])
+    try:
+        collection.create_index('news_id', unique=unique)
+    except OperationFailure as e:
+        logger.warning(f'news_id index of {collection.full_name} left as is: {e}')
+
+
+def is_time_series(collection: Collection) -> bool:
+    """Time series collections don't enforce a unique `_id`."""
+    return collection.options().get('timeseries') is not None
+
+
+def get_collection(client: MongoClient,
+                   press: str,
+                   begin: str,
+                   layout: Layout                 = 'daily',
+                   db_name: Optional[str]         = None,
+                   collection_name: Optional[str] = None,
+                   time_series: bool              = False
+                  ) -> Collection:
+    """Collection storing the articles of `press` published at `begin`.
+
+    Args:
+        `layout`:      `daily` (a database per press, a collection per day),
+                       `press` (a database per press, one `news` collection) or
+                       `single` (one `news` collection for every press)
+        `db_name`:     name of the database, default to `press` (`bigkinds` for `single`)
+        `collection_name`: only used by the `daily` layout, default to `begin`
+        `time_series`: create the consolidated collection as a mongodb time series
+                       collection bucketed by press (`metaField`) and date, its
+                       `_id` isn't unique so writers look the news id up before
+                       inserting (see `MongoWriter`)
+    """
+    if layout == 'daily':
+        db = client[press if db_name is None else db_name]
+        return db[collection_name if collection_name is not None else begin]
+
+    db = client[
+        db_name
+        if db_name is not None
+        else
+        (press if layout == 'press' else SINGLE_DB)
+    ]
+    if NEWS_COLLECTION not in db.list_collection_names():
+        db.create_collection(
+            NEWS_COLLECTION,
+            **(
+                {'timeseries': {'timeField': 'date', 'metaField': 'press', 'granularity': 'hours'}}
+                if time_series
+                else
+                {}
+            )
+        )
+    collection = db[NEWS_COLLECTION]
+    ensure_indexes(collection, unique=not is_time_series(collection))
+
+    return collection
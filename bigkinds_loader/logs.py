@@ -0,0 +1,119 @@
+from collections import Counter
+from loguru import logger
+from pathlib import Path
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+_shard_sink: Optional[int] = None
+_sink_lock = threading.Lock()
+
+
+def setup_logging(log_file: Path | str,
+                  structured: bool = True,
+                  level: str       = 'INFO'
+                 ) -> int:
+    """Send the logs to `log_file` through loguru's background queue.
+
+    Only the sink added by the previous call is replaced: the console and
+    the sinks of a long running process (e.g. `Service`) keep receiving
+    the records of every shard.
+
+    Args:
+        `log_file`:   target file
+        `structured`: one JSON record per line instead of formatted text
+        `level`:      minimum level
+
+    Returns:
+        the loguru id of the sink
+    """
+    global _shard_sink
+    with _sink_lock:
+        if _shard_sink is not None:
+            try:
+                logger.remove(_shard_sink)
+            except ValueError:
+                # already removed by the caller
+                pass
+        _shard_sink = logger.add(log_file, level=level, enqueue=True, serialize=structured)
+        return _shard_sink
+
+
+class LogSampler:
+    """Token bucket per event: at most `burst` records at once and `rate`
+    records per second afterwards, the suppressed ones are counted."""
+    def __init__(self, rate: float = 1., burst: int = 10) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens: Dict[str, float] = {}
+        self.updated: Dict[str, float] = {}
+        self.suppressed: Counter = Counter()
+        self.lock = threading.Lock()
+
+
+    def allow(self, event: str) -> bool:
+        now = time.monotonic()
+        with self.lock:
+            tokens = min(
+                self.burst,
+                self.tokens.get(event, self.burst) + (now - self.updated.get(event, now)) * self.rate
+            )
+            self.updated[event] = now
+            if tokens >= 1:
+                self.tokens[event] = tokens - 1
+                return True
+            self.tokens[event] = tokens
+            self.suppressed[event] += 1
+            return False
+
+
+    def pop_suppressed(self) -> Dict[str, int]:
+        with self.lock:
+            res = dict(self.suppressed)
+            self.suppressed.clear()
+        return res
+
+
+sampler = LogSampler()
+
+
+class ShardSummary:
+    """Counts, status codes and request durations of a shard, logged as a
+    single record by `close` instead of a line per article."""
+    def __init__(self, shard: str) -> None:
+        self.shard = shard
+        self.status: Counter = Counter()
+        self.durations: List[float] = []
+        self.t0 = time.perf_counter()
+
+
+    def record(self, status: str | int, seconds: float) -> None:
+        self.status[str(status)] += 1
+        self.durations.append(seconds)
+
+
+    def summary(self) -> Dict:
+        durations = sorted(self.durations)
+        n = len(durations)
+        return {
+            'shard': self.shard,
+            'requests': n,
+            'status': dict(self.status),
+            'elapsed': round(time.perf_counter() - self.t0, 3),
+            'duration': {
+                'mean': round(sum(durations) / n, 4),
+                'p50': round(durations[n // 2], 4),
+                'p95': round(durations[min(n - 1, int(n * .95))], 4),
+                'max': round(durations[-1], 4)
+            } if n > 0 else {},
+            'suppressed_logs': sampler.pop_suppressed()
+        }
+
+
+    def close(self) -> Dict:
+        res = self.summary()
+        logger.bind(summary=res).info(
+            f'shard {self.shard}: {res["requests"]} requests, status {res["status"]}'
+        )
+        return res
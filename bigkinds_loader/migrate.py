@@ -0,0 +1,79 @@
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from pymongo import MongoClient
+from typing import Dict, Optional
+
+from .layout import Layout, daily_collections, get_collection, to_consolidated
+from .writer import MongoWriter
+
+
+def migrate(client: MongoClient,
+            press: str,
+            layout: Layout                = 'press',
+            db_name: Optional[str]        = None,
+            target_db_name: Optional[str] = None,
+            workers: int                  = 4,
+            batch_size: int               = 1000,
+            time_series: bool             = False,
+            drop: bool                    = False
+           ) -> Dict[str, int]:
+    """Move the daily collections of a press into a consolidated layout.
+
+    Every daily collection is copied by its own thread through a
+    `MongoWriter`. Documents are keyed by their news id like crawled ones,
+    so documents already migrated (or crawled again since) are skipped
+    thanks to their `_id` and the unique `news_id` index (or, for a time
+    series target, whose `_id` isn't unique, to a lookup of their
+    `news_id`), and an interrupted migration can simply be run again.
+
+    Args:
+        `client`:         mongodb client
+        `press`:          the press of the newspaper
+        `layout`:         target layout, `press` or `single`
+        `db_name`:        database of the daily collections, default to `press`
+        `target_db_name`: database of the consolidated collection, see `get_collection`
+        `workers`:        number of daily collections copied in parallel
+        `batch_size`:     number of documents per read and insert
+        `time_series`:    create the target as a time series collection
+        `drop`:           drop a daily collection once all its documents are migrated
+
+    Returns:
+        the number of documents of every daily collection
+    """
+    if layout == 'daily':
+        raise ValueError('the target layout has to be consolidated')
+
+    source_db = client[press if db_name is None else db_name]
+    target = get_collection(
+        client,
+        press,
+        '',
+        layout,
+        target_db_name,
+        time_series=time_series
+    )
+    logger.info(f'migrate {source_db.name} into {target.database.name}.{target.name}')
+
+    def copy(name: str) -> int:
+        source = source_db[name]
+        n = 0
+        with MongoWriter(target, batch_size, 4 * batch_size) as writer:
+            for doc in source.find({}, batch_size=batch_size):
+                # legacy documents are keyed by ObjectId, crawls by news id
+                if 'news_id' in doc:
+                    doc['_id'] = doc['news_id']
+                writer.put(to_consolidated(doc, press))
+                n += 1
+
+        # the writer raises if any insert failed, every document is in `target`
+        if drop:
+            source.drop()
+        logger.info(f'migrate {n} documents from {source_db.name}.{name}')
+        return n
+
+    names = daily_collections(source_db)
+    with ThreadPoolExecutor(workers) as pool:
+        counts = dict(zip(names, pool.map(copy, names)))
+
+    logger.info(f'migrate {sum(counts.values())} documents of {press} into {layout} layout')
+    return counts
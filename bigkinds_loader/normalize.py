@@ -0,0 +1,70 @@
+import html
+import re
+from selectolax.lexbor import LexborHTMLParser
+from typing import Dict, List
+import unicodedata
+
+
+_BR = re.compile(r'<\s*br\s*/?\s*>|<\s*/\s*p\s*>', re.IGNORECASE)
+_EMAIL = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+_SPACES = re.compile(r'[ \t\u00a0\u200b]+')
+_NEWLINES = re.compile(r'\s*\n\s*(?:\n\s*)+')
+# `[서울=한국경제] `, `(서울=연합뉴스) 홍길동 기자 = ` at the beginning
+_LEAD_BYLINE = re.compile(
+    r'^\s*(?:[\[\(][^\]\)\n]{0,40}=[^\]\)\n]{0,40}[\]\)]\s*)?'
+    r'(?:[가-힣]{2,4}\s*(?:기자|특파원)\s*=\s*)?'
+)
+# `홍길동 기자`, `홍길동 기자 hong@hankyung.com` at the end
+_TAIL_BYLINE = re.compile(
+    r'\s*[\[\(]?[가-힣]{2,4}\s*(?:기자|특파원|객원기자|논설위원)\s*'
+    r'(?:[\w.+-]+@[\w-]+(?:\.[\w-]+)+)?\s*[\]\)]?\s*$'
+)
+
+
+def normalize_text(text: str,
+                   strip_byline: bool = False,
+                   strip_email: bool  = False
+                  ) -> str:
+    """Strip the markup, decode the entities and normalize a news content.
+
+    Hangul is composed with NFC so that the same syllable always has the
+    same code points.
+
+    Args:
+        `text`:         raw `CONTENT` of the detail payload
+        `strip_byline`: remove the reporter byline at the beginning and the end
+        `strip_email`:  remove the email addresses
+    """
+    if text == '':
+        return ''
+
+    text = _BR.sub('\n', text)
+    tree = LexborHTMLParser(text)
+    text = tree.body.text(separator='') if tree.body is not None else text
+    # entities escaped twice survive the parser
+    text = html.unescape(text)
+    text = unicodedata.normalize('NFC', text)
+
+    if strip_byline:
+        text = _TAIL_BYLINE.sub('', _LEAD_BYLINE.sub('', text, count=1), count=1)
+    if strip_email:
+        text = _EMAIL.sub('', text)
+
+    text = _SPACES.sub(' ', text)
+    text = _NEWLINES.sub('\n\n', text)
+    return '\n'.join(line.strip() for line in text.split('\n')).strip()
+
+
+def normalize_batch(batch: List[Dict],
+                    strip_byline: bool = False,
+                    strip_email: bool  = False
+                   ) -> List[Dict]:
+    """Add `clean_content`, the normalized `content`, to every document."""
+    for doc in batch:
+        doc['clean_content'] = normalize_text(
+            doc.get('content') or '',
+            strip_byline,
+            strip_email
+        )
+
+    return batch
@@ -0,0 +1,177 @@
+from calendar import monthrange
+from datetime import datetime
+from hashlib import blake2b
+from loguru import logger
+import orjson
+from pathlib import Path
+from pymongo import MongoClient
+from typing import Dict, Generator, Optional, Sequence, Tuple
+
+from .layout import Layout, to_consolidated
+from .reader import NewsReader
+
+
+MANIFEST = '_manifest.json'
+
+
+def months(begin: str, end: str) -> Generator[Tuple[str, str], None, None]:
+    """Whole months overlapping [`begin`, `end`] as (first day, last day)."""
+    year, month = map(int, begin.split('-')[:2])
+    last = tuple(map(int, end.split('-')[:2]))
+    while (year, month) <= last:
+        yield f'{year}-{month:02d}-01', f'{year}-{month:02d}-{monthrange(year, month)[1]:02d}'
+        year, month = (year, month + 1) if month < 12 else (year + 1, 1)
+
+
+def partition_path(output_dir: Path | str, press: str, begin: str) -> Path:
+    """Hive-style directory of a press and month, read back as columns by
+    `pyarrow.dataset` (and pandas, polars, duckdb ...)."""
+    year, month = begin.split('-')[:2]
+    return Path(output_dir) / f'press={press}' / f'year={year}' / f'month={month}'
+
+
+def fingerprint(reader: NewsReader,
+                press: str,
+                begin: str,
+                end: str,
+                db_name: Optional[str] = None
+               ) -> Tuple[int, str]:
+    """Number of articles and digest of their news id, content hash and
+    revision, computed without reading any text."""
+    keys = []
+    for collection, filter in reader.scans(press, begin, end, db_name):
+        for doc in collection.find(filter, {'_id': 0, 'news_id': 1, 'content_hash': 1, 'revision': 1}):
+            keys.append((doc.get('news_id', ''), doc.get('content_hash', ''), doc.get('revision', 0)))
+
+    h = blake2b(digest_size=16)
+    for key in sorted(keys):
+        h.update(orjson.dumps(key))
+    return len(keys), h.hexdigest()
+
+
+def _schema(fields: Sequence[str]):
+    import pyarrow as pa
+    return pa.schema(
+        [('news_id', pa.string()), ('date', pa.timestamp('s'))]
+        +
+        [(field, pa.string()) for field in fields]
+    )
+
+
+def _write_partition(reader: NewsReader,
+                     press: str,
+                     begin: str,
+                     end: str,
+                     file: Path,
+                     fields: Sequence[str],
+                     db_name: Optional[str],
+                     compression: str
+                    ) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _schema(fields)
+    columns = ['news_id', 'date', *fields]
+    file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = file.with_suffix('.parquet.tmp')
+    n = 0
+    with pq.ParquetWriter(tmp, schema, compression=compression, use_dictionary=True) as writer:
+        for batch in reader.read(press, begin, end, columns, 'dict', db_name):
+            rows = [
+                {k: v for k, v in to_consolidated(doc, press).items() if k in schema.names}
+                for doc in batch
+            ]
+            writer.write_batch(pa.RecordBatch.from_pylist(rows, schema))
+            n += len(rows)
+    tmp.replace(file)
+    return n
+
+
+def export_parquet(press: str,
+                   begin: str,
+                   end: str,
+                   output_dir: Path | str        = 'data/parquet',
+                   fields: Sequence[str]         = ('title', 'content'),
+                   layout: Layout                = 'daily',
+                   db_name: Optional[str]        = None,
+                   client: Optional[MongoClient] = None,
+                   compression: str              = 'zstd',
+                   batch_size: int               = 1000,
+                   force: bool                   = False
+                  ) -> Dict[str, int]:
+    """Export the stored articles to Parquet, one partition per press and month.
+
+    Every month overlapping [`begin`, `end`] is exported whole to
+    `{output_dir}/press=.../year=.../month=.../part.parquet`, with dictionary
+    encoded and compressed columns. `{output_dir}/_manifest.json` keeps the
+    `fingerprint` of every written partition, and a partition is only
+    rewritten when its fingerprint changed (new, deleted or revalidated
+    articles), so nightly runs over a long period touch the recent months only.
+
+    Requires pyarrow.
+
+    Args:
+        `press`:       the press of the newspaper
+        `begin`:       begin date
+        `end`:         end date
+        `output_dir`:  root of the partitioned dataset
+        `fields`:      text columns exported besides `news_id` and `date`, `press`,
+                       `year` and `month` come from the partition directories
+        `layout`:      storage layout, see `layout.get_collection`
+        `db_name`:     name of the mongodb database
+        `compression`: parquet codec, e.g. `zstd`, `snappy`, `gzip`
+        `force`:       rewrite every partition of the period
+
+    Returns:
+        the number of written and skipped partitions and of written rows
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError('the parquet export requires pyarrow') from e
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_file = output_dir / MANIFEST
+    manifest = orjson.loads(manifest_file.read_bytes()) if manifest_file.exists() else {}
+
+    reader = NewsReader(client, batch_size, layout=layout)
+    counts = {'written': 0, 'skipped': 0, 'rows': 0}
+    for month_begin, month_end in months(begin, end):
+        key = f'{press}/{month_begin[:7]}'
+        file = partition_path(output_dir, press, month_begin) / 'part.parquet'
+        n, digest = fingerprint(reader, press, month_begin, month_end, db_name)
+        entry = manifest.get(key)
+        if (
+            not force
+            and entry is not None
+            and entry['fingerprint'] == digest
+            and entry['fields'] == list(fields)
+            and file.exists()
+        ):
+            counts['skipped'] += 1
+            continue
+
+        if n == 0:
+            file.unlink(missing_ok=True)
+            manifest.pop(key, None)
+        else:
+            rows = _write_partition(reader, press, month_begin, month_end, file, fields, db_name, compression)
+            manifest[key] = {
+                'file': str(file.relative_to(output_dir)),
+                'rows': rows,
+                'fingerprint': digest,
+                'fields': list(fields),
+                'written': datetime.now().isoformat(timespec='seconds')
+            }
+            counts['written'] += 1
+            counts['rows'] += rows
+            logger.info(f'export {key}: {rows} rows to {file}')
+
+        # after every partition, an interrupted run keeps what it wrote
+        tmp = manifest_file.with_suffix('.json.tmp')
+        tmp.write_bytes(orjson.dumps(manifest, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
+        tmp.replace(manifest_file)
+
+    logger.info(f'export {press} {begin}/{end}: {counts}')
+    return counts
@@ -0,0 +1,117 @@
+from aiolimiter import AsyncLimiter
+import asyncio
+import csv
+from datetime import timedelta
+import httpx
+from loguru import logger
+import math
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .api import SEARCH_URL, load_press_code, search_payload
+from .engine import get_engine
+from .work_queue import split_period
+
+
+async def count_articles(client: httpx.AsyncClient,
+                         limiter: AsyncLimiter,
+                         press_code: str,
+                         day: str,
+                         max_retry: int = 5
+                        ) -> int:
+    """`totalCount` of a press and day from a single-result search, -1 on failure."""
+    for retry in range(max_retry):
+        async with limiter:
+            try:
+                r = await client.post(
+                    SEARCH_URL,
+                    json=search_payload([press_code], day, day, 1, 1)
+                )
+                if r.status_code == httpx.codes.OK:
+                    return int(r.json()['totalCount'])
+                logger.info(f'{press_code}/{day}: status {r.status_code}')
+            except httpx.HTTPError as e:
+                logger.info(f'{press_code}/{day}: {e!r}, re-send the request')
+        await asyncio.sleep(2 ** retry)
+
+    return -1
+
+
+async def async_count(press: List[str],
+                      begin: str,
+                      end: str,
+                      max_rate: int,
+                      time_period: float,
+                      timeout: float,
+                      proxy: Optional[str]
+                     ) -> List[Dict]:
+    press2code = load_press_code()
+    limiter = AsyncLimiter(max_rate, time_period)
+    keys = [
+        (p, day)
+        for p in press
+        for day, _ in split_period(begin, end, 1)
+    ]
+
+    client = get_engine().client(proxy, timeout)
+    async with asyncio.TaskGroup() as tg:
+        tasks = [
+            tg.create_task(count_articles(client, limiter, press2code[p], day))
+            for p, day in keys
+        ]
+
+    return [
+        {'press': p, 'date': day, 'count': task.result()}
+        for (p, day), task in zip(keys, tasks)
+    ]
+
+
+def plan(press: str | List[str],
+         begin: str,
+         end: str,
+         output_dir: Path | str = 'data/plan',
+         max_rate: int          = 100,
+         time_period: float     = 3,
+         page_size: int         = 100,
+         timeout: float         = 300,
+         proxy: Optional[str]   = None
+        ) -> Dict[str, float]:
+    """Count the articles of every press and day without fetching any content.
+
+    The per-day counts are written to `{output_dir}/{press}_{begin}_{end}.csv`
+    and the workload (search pages of `page_size`, one detail request per
+    article) is turned into an ETA with the rate limit of `max_rate` requests
+    per `time_period` seconds.
+
+    Returns:
+        the number of articles, requests and the estimated seconds
+    """
+    press = [press] if isinstance(press, str) else list(press)
+    rows = get_engine().run(async_count(press, begin, end, max_rate, time_period, timeout, proxy))
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / f'{"_".join(press)}_{begin}_{end}.csv'
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['press', 'date', 'count'])
+        writer.writeheader()
+        writer.writerows(rows)
+
+    n_articles = sum(row['count'] for row in rows if row['count'] > 0)
+    n_search = sum(math.ceil(row['count'] / page_size) for row in rows if row['count'] > 0)
+    n_requests = n_articles + n_search
+    seconds = n_requests / (max_rate / time_period)
+    summary = {
+        'articles': n_articles,
+        'failed_days': sum(row['count'] < 0 for row in rows),
+        'search_requests': n_search,
+        'detail_requests': n_articles,
+        'seconds': seconds
+    }
+    logger.info(
+        f'plan {",".join(press)} {begin}/{end}: {n_articles} articles, '
+        f'{n_requests} requests, ETA {timedelta(seconds=round(seconds))} '
+        f'at {max_rate} requests per {time_period}s, table: {output_file}'
+    )
+
+    return summary
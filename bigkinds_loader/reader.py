@@ -0,0 +1,237 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pymongo import MongoClient
+from pymongo.collection import Collection
+import queue
+import threading
+from typing import Any, Dict, Generator, List, Literal, Optional, Sequence, Tuple
+
+from .engine import get_engine
+from .layout import Layout, NEWS_COLLECTION, SINGLE_DB, daily_collections, parse_date
+from .work_queue import split_period
+
+
+_DONE = object()
+
+
+def _to_format(batch: List[Dict], format: str) -> Any:
+    match format:
+        case 'dict':
+            return batch
+        case 'arrow':
+            try:
+                import pyarrow as pa
+            except ImportError as e:
+                raise ImportError('`format="arrow"` requires pyarrow') from e
+            # legacy documents have an ObjectId `_id`, which arrow can't convert
+            return pa.RecordBatch.from_pylist([
+                doc | {'_id': str(doc['_id'])} if '_id' in doc else doc
+                for doc in batch
+            ])
+        case 'pandas':
+            try:
+                import pandas as pd
+            except ImportError as e:
+                raise ImportError('`format="pandas"` requires pandas') from e
+            return pd.DataFrame.from_records(batch)
+        case _:
+            raise ValueError(f'unknown format: {format}')
+
+
+class NewsReader:
+    """Stream the stored articles back in bounded batches.
+
+    Every collection of the period (or, for a consolidated layout, every
+    chunk of `chunk_days` days scanned through the (press, date) index) is
+    read by its own thread with a tuned cursor `batch_size`, and batches are
+    handed over through a bounded queue, so memory stays at roughly
+    `max_workers + prefetch` batches whatever the size of the period.
+
+    Args:
+        `client`:      mongodb client, default to one connected to `CONN_STR`
+        `batch_size`:  number of documents per batch (and per cursor round trip)
+        `max_workers`: number of collections read in parallel
+        `prefetch`:    number of batches buffered ahead of the consumer
+        `layout`:      storage layout, see `layout.get_collection`
+        `chunk_days`:  length of the date ranges read in parallel for a consolidated layout
+    """
+    def __init__(self,
+                 client: Optional[MongoClient] = None,
+                 batch_size: int               = 1000,
+                 max_workers: int              = 4,
+                 prefetch: int                 = 8,
+                 layout: Layout                = 'daily',
+                 chunk_days: int               = 7
+                ) -> None:
+        self.client = (
+            client
+            if client is not None
+            else
+            get_engine().mongo()
+        )
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.prefetch = prefetch
+        self.layout = layout
+        self.chunk_days = chunk_days
+
+
+    def collections(self,
+                    press: str,
+                    begin: str,
+                    end: str,
+                    db_name: Optional[str] = None
+                   ) -> List[Collection]:
+        """Daily collections (named after their date) which may hold articles
+        of the period.
+
+        A shard spanning several days is stored under the name of its first
+        day, so a collection named before `begin` is kept if its latest news
+        id (an index lookup on `_id`) reaches `begin`. Legacy collections
+        keyed by ObjectId are kept as well, the date filter of `scans`
+        trims them.
+        """
+        db = self.client[press if db_name is None else db_name]
+        res = []
+        for name in daily_collections(db):
+            if name > end:
+                break
+            if name < begin:
+                last = db[name].find_one({}, {'_id': 1}, sort=[('_id', -1)])
+                if last is None:
+                    continue
+                date = parse_date('', last['_id']) if isinstance(last['_id'], str) else None
+                if date is not None and date.strftime('%Y-%m-%d') < begin:
+                    continue
+            res.append(db[name])
+        return res
+
+
+    def scans(self,
+              press: str,
+              begin: str,
+              end: str,
+              db_name: Optional[str] = None
+             ) -> List[Tuple[Collection, Dict]]:
+        """(collection, filter) pairs covering the period, read in parallel."""
+        if self.layout == 'daily':
+            # `date` is kept as `yyyy-mm-dd HH:MM:SS` by the daily layout
+            filter = {
+                'date': {
+                    '$gte': begin,
+                    '$lt': (datetime.strptime(end, '%Y-%m-%d') + timedelta(1)).strftime('%Y-%m-%d')
+                }
+            }
+            return [
+                (collection, filter)
+                for collection in self.collections(press, begin, end, db_name)
+            ]
+
+        db = self.client[
+            db_name
+            if db_name is not None
+            else
+            (press if self.layout == 'press' else SINGLE_DB)
+        ]
+        return [
+            (
+                db[NEWS_COLLECTION],
+                {
+                    'press': press,
+                    'date': {
+                        '$gte': datetime.strptime(chunk_begin, '%Y-%m-%d'),
+                        '$lt': datetime.strptime(chunk_end, '%Y-%m-%d') + timedelta(1)
+                    }
+                }
+            )
+            for chunk_begin, chunk_end in split_period(begin, end, self.chunk_days)
+        ]
+
+
+    def __read(self,
+               collection: Collection,
+               filter: Dict,
+               projection: Optional[Dict],
+               out: queue.Queue,
+               stop: threading.Event
+              ) -> None:
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    out.put(item, timeout=.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        if stop.is_set():
+            return
+        try:
+            batch = []
+            cursor = collection.find(filter, projection, batch_size=self.batch_size)
+            for doc in cursor:
+                batch.append(doc)
+                if len(batch) == self.batch_size:
+                    if not put(batch):
+                        cursor.close()
+                        return
+                    batch = []
+            if len(batch) > 0:
+                put(batch)
+        except Exception as e:
+            put(e)
+        finally:
+            put(_DONE)
+
+
+    def read(self,
+             press: str,
+             begin: str,
+             end: Optional[str]               = None,
+             fields: Optional[Sequence[str]]  = None,
+             format: Literal['dict', 'arrow', 'pandas'] = 'dict',
+             db_name: Optional[str]           = None
+            ) -> Generator[Any, None, None]:
+        """Yield the articles of a press and period in batches.
+
+        Batches of different collections (or chunks) are interleaved.
+
+        Args:
+            `press`:   the press of the newspaper
+            `begin`:   begin date
+            `end`:     end date, default to begin
+            `fields`:  fields to return, default to all of them
+            `format`:  `dict` (list of documents), `arrow` (pyarrow.RecordBatch)
+                       or `pandas` (pandas.DataFrame)
+            `db_name`: name of the mongodb database, default to `press`
+        """
+        if end is None:
+            end = begin
+        projection = (
+            {field: 1 for field in fields} | {'_id': int('_id' in fields)}
+            if fields is not None
+            else
+            None
+        )
+        scans = self.scans(press, begin, end, db_name)
+        if len(scans) == 0:
+            return
+
+        out = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        n_running = len(scans)
+        with ThreadPoolExecutor(min(self.max_workers, len(scans))) as pool:
+            for collection, filter in scans:
+                pool.submit(self.__read, collection, filter, projection, out, stop)
+
+            try:
+                while n_running > 0:
+                    item = out.get()
+                    if item is _DONE:
+                        n_running -= 1
+                    elif isinstance(item, Exception):
+                        raise item
+                    else:
+                        yield _to_format(item, format)
+            finally:
+                stop.set()
@@ -0,0 +1,118 @@
+from hashlib import blake2b
+import msgspec
+import orjson
+from typing import Dict, Optional, Sequence
+
+
+def content_hash(doc: Dict) -> str:
+    """Fingerprint of the editable part of an article."""
+    h = blake2b(digest_size=16)
+    h.update((doc.get('title') or '').encode())
+    h.update(b'\x00')
+    h.update((doc.get('content') or '').encode())
+    return h.hexdigest()
+
+
+class Article:
+    """Typed record of a fetched article.
+
+    `__slots__` keeps a record at a fixed handful of references instead of
+    a dict, and the record turns into the document of the sink (`to_doc`
+    for mongodb, `to_json` for the JSONL exports) without another pass over
+    the detail payload.
+    """
+    __slots__ = ('news_id', 'date', 'title', 'content', 'status', 'raw')
+
+    def __init__(self,
+                 news_id: str,
+                 date: str,
+                 title: str,
+                 content: str,
+                 status: str                     = '200',
+                 raw: Optional[Dict[str, str]]   = None
+                ) -> None:
+        self.news_id = news_id
+        self.date = date
+        self.title = title
+        self.content = content
+        self.status = status
+        self.raw = raw
+
+
+    @property
+    def content_hash(self) -> str:
+        return content_hash({'title': self.title, 'content': self.content})
+
+
+    def to_doc(self) -> Dict:
+        doc = {
+            'date': self.date,
+            'title': self.title,
+            'content': self.content,
+            'news_id': self.news_id,
+            'status': self.status,
+            'content_hash': self.content_hash
+        }
+        if self.raw is not None:
+            doc['raw'] = self.raw
+        return doc
+
+
+    def to_json(self) -> bytes:
+        """One line of a JSONL export."""
+        return orjson.dumps(
+            {
+                'news_id': self.news_id,
+                'date': self.date,
+                'title': self.title,
+                'content': self.content
+            },
+            option=orjson.OPT_APPEND_NEWLINE
+        )
+
+
+class _Detail(msgspec.Struct):
+    DATE: Optional[str] = None
+    TITLE: Optional[str] = None
+    CONTENT: Optional[str] = None
+    # `enrich.RAW_FIELDS`
+    TMS_SIMILARITY: Optional[str] = None
+    TMS_NE_LOCATION: Optional[str] = None
+    CATEGORY_MAIN: Optional[str] = None
+
+
+class _Response(msgspec.Struct):
+    detail: _Detail
+
+
+_decoder = msgspec.json.Decoder(_Response)
+
+
+def decode_detail(content: bytes,
+                  news_id: str,
+                  raw_fields: Sequence[str] = (),
+                  status: str               = '200'
+                 ) -> Article:
+    """Decode the body of a `detailView.do` response into an `Article`.
+
+    The body is decoded against the few fields kept (the detail payload
+    carries dozens more), which are skipped without being turned into python
+    objects.
+
+    Args:
+        `raw_fields`: fields of the detail payload kept untouched under `raw`,
+                      among `enrich.RAW_FIELDS`
+
+    Raises:
+        `msgspec.DecodeError`: malformed body (`msgspec.ValidationError` for an
+                               unexpected payload)
+    """
+    detail = _decoder.decode(content).detail
+    return Article(
+        news_id,
+        detail.DATE,
+        detail.TITLE,
+        detail.CONTENT,
+        status,
+        {k: getattr(detail, k, None) for k in raw_fields} if len(raw_fields) > 0 else None
+    )
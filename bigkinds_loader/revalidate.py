@@ -0,0 +1,198 @@
+from aiolimiter import AsyncLimiter
+import asyncio
+from collections import Counter
+from datetime import datetime, timezone
+import httpx
+from loguru import logger
+import math
+import msgspec
+from pymongo import MongoClient
+from pymongo.collection import Collection
+from typing import Dict, List, Optional
+
+from .api import DETAIL_URL, detail_params
+from .engine import get_engine
+from .fts import FullTextIndex
+from .layout import Layout, parse_date
+from .normalize import normalize_text
+from .reader import NewsReader
+from .record import Article, content_hash, decode_detail
+from .summary import DailySummary
+
+
+HISTORY_COLLECTION = 'news_history'
+
+
+async def fetch_detail(client: httpx.AsyncClient,
+                       limiter: AsyncLimiter,
+                       news_id: str,
+                       max_retry: int = 3
+                      ) -> Optional[Article]:
+    for retry in range(max_retry):
+        async with limiter:
+            try:
+                r = await client.get(DETAIL_URL, params=detail_params(news_id))
+                if r.status_code == httpx.codes.OK:
+                    return decode_detail(r.content, news_id)
+            except httpx.HTTPError as e:
+                logger.info(f'{news_id}: {e!r}, re-send the request')
+            except msgspec.DecodeError as e:
+                logger.info(f'{news_id}: {e!r}, re-send the request')
+        await asyncio.sleep(2 ** retry)
+    return None
+
+
+async def async_revalidate(collection: Collection,
+                           docs: List[Dict],
+                           max_rate: int,
+                           time_period: float,
+                           timeout: float,
+                           proxy: Optional[str],
+                           press: Optional[str]          = None,
+                           strip_byline: bool            = False,
+                           strip_email: bool             = False,
+                           fts: Optional[FullTextIndex]  = None,
+                           daily: Optional[DailySummary] = None
+                          ) -> Dict[str, int]:
+    limiter = AsyncLimiter(max_rate, time_period)
+    client = get_engine().client(proxy, timeout)
+    history = collection.database[HISTORY_COLLECTION]
+    counts = {'checked': 0, 'changed': 0, 'failed': 0}
+    revised = []
+    chars = Counter()
+
+    def replace(doc: Dict, new: Dict) -> None:
+        # blocking pymongo calls and selectolax parsing, run off the event loop
+        now = datetime.now(timezone.utc)
+        history.insert_one({
+            'news_id': doc['news_id'],
+            'collection': collection.name,
+            'title': doc.get('title'),
+            'content': doc.get('content'),
+            'content_hash': doc.get('content_hash', content_hash(doc)),
+            'replaced_at': now
+        })
+        if 'clean_content' in doc:
+            new['clean_content'] = normalize_text(new['content'], strip_byline, strip_email)
+        collection.update_one(
+            {'_id': doc['_id']},
+            {'$set': new | {'revised_at': now}, '$inc': {'revision': 1}}
+        )
+
+    async def check(doc: Dict) -> None:
+        detail = await fetch_detail(client, limiter, doc['news_id'])
+        if detail is None:
+            counts['failed'] += 1
+            return
+
+        counts['checked'] += 1
+        new = {
+            'title': detail.title,
+            'content': detail.content,
+            'content_hash': detail.content_hash
+        }
+        if new['content_hash'] == doc.get('content_hash', content_hash(doc)):
+            return
+
+        counts['changed'] += 1
+        await asyncio.to_thread(replace, doc, new)
+
+        revised.append(doc | new)
+        date = doc.get('date')
+        if not isinstance(date, datetime):
+            date = parse_date(date or '', doc['news_id'])
+        if date is not None:
+            chars[date.strftime('%Y-%m-%d')] += len(new['content'] or '') - len(doc.get('content') or '')
+
+    async with asyncio.TaskGroup() as tg:
+        for doc in docs:
+            tg.create_task(check(doc))
+
+    if fts is not None and len(revised) > 0:
+        fts.add(revised, press)
+    if daily is not None:
+        daily.add_chars(chars, press)
+    return counts
+
+
+def revalidate(press: str,
+               begin: str,
+               end: str,
+               sample: float                 = 1.,
+               layout: Layout                = 'daily',
+               db_name: Optional[str]        = None,
+               client: Optional[MongoClient] = None,
+               max_rate: int                 = 10,
+               time_period: float            = 3,
+               timeout: float                = 300,
+               proxy: Optional[str]          = None,
+               strip_byline: bool            = False,
+               strip_email: bool             = False,
+               fts_path: Optional[str]       = None,
+               summary_db: Optional[str]     = None
+              ) -> Dict[str, int]:
+    """Re-fetch stored articles and rewrite the ones that were edited.
+
+    Articles are compared through their `content_hash` (computed from the
+    stored text for articles ingested without it). The previous version of
+    a changed article is kept in the `news_history` collection of its
+    database. Meant to run at a much lower rate than the crawl.
+
+    Rewritten articles get their `clean_content` normalized with the options
+    of the ingestion, and are re-indexed in the full-text index and
+    re-accounted in the daily summary when these are given.
+
+    Args:
+        `press`:        the press of the newspaper
+        `begin`:        begin of the window of publication dates to check
+        `end`:          end of the window
+        `sample`:       fraction of the articles of the window to check
+        `layout`:       storage layout, see `layout.get_collection`
+        `db_name`:      name of the mongodb database
+        `client`:       mongodb client, default to one connected to `CONN_STR`
+        `max_rate`:     re-fetches per `time_period` seconds
+        `strip_byline`: see `normalize.normalize_text`, as set for the ingestion
+        `strip_email`:  see `normalize.normalize_text`, as set for the ingestion
+        `fts_path`:     SQLite file of the full-text index, see `get_news_batch`
+        `summary_db`:   database of the daily summary, see `get_news_batch`
+
+    Returns:
+        the number of checked, changed and failed articles
+    """
+    reader = NewsReader(client, layout=layout)
+    fields = {'news_id': 1, 'date': 1, 'title': 1, 'content': 1, 'content_hash': 1, 'clean_content': 1}
+    counts = {'checked': 0, 'changed': 0, 'failed': 0}
+    fts = FullTextIndex(fts_path) if fts_path is not None else None
+    daily = DailySummary.from_db(reader.client, summary_db) if summary_db is not None else None
+
+    for collection, filter in reader.scans(press, begin, end, db_name):
+        n = collection.count_documents(filter)
+        size = math.ceil(n * sample)
+        if size == 0:
+            continue
+        docs = list(collection.aggregate([
+            {'$match': filter},
+            {'$sample': {'size': size}},
+            {'$project': fields}
+        ]))
+        res = get_engine().run(async_revalidate(
+            collection,
+            docs,
+            max_rate,
+            time_period,
+            timeout,
+            proxy,
+            press,
+            strip_byline,
+            strip_email,
+            fts,
+            daily
+        ))
+        for key in counts:
+            counts[key] += res[key]
+        logger.info(f'revalidate {collection.full_name} {filter}: {res}')
+
+    if fts is not None:
+        fts.close()
+    logger.info(f'revalidate {press} {begin}/{end}: {counts}')
+    return counts
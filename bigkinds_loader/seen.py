@@ -0,0 +1,254 @@
+from contextlib import contextmanager
+import fcntl
+from hashlib import blake2b
+from loguru import logger
+import math
+import mmap
+from pathlib import Path
+import struct
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+
+_MAGIC = b'BKBF'
+_VERSION = 1
+# magic, version, number of hash functions, number of bits, capacity, count
+_HEADER = struct.Struct('<4sIIQQQ')
+_PAGE = 4096
+
+
+def _hashes(key: str) -> Tuple[int, int]:
+    digest = blake2b(key.encode(), digest_size=16).digest()
+    return (
+        int.from_bytes(digest[:8], 'little'),
+        int.from_bytes(digest[8:], 'little') | 1
+    )
+
+
+class BloomFilter:
+    """Bloom filter persisted in a memory-mapped file.
+
+    Read-only instances of the same file share the page cache across
+    processes. Bits are only ever set, so concurrent writers can at worst
+    lose a bit, which turns into a refetch, never into a skipped article.
+    """
+    def __init__(self, path: Path | str, readonly: bool = False) -> None:
+        self.path = Path(path)
+        self.readonly = readonly
+        with open(self.path, 'rb' if readonly else 'r+b') as f:
+            self._mm = mmap.mmap(
+                f.fileno(),
+                0,
+                access=mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE
+            )
+
+        magic, version, self.n_hashes, self.n_bits, self.capacity, _ = \
+            _HEADER.unpack_from(self._mm)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f'not a bloom filter: {self.path}')
+
+
+    @classmethod
+    def create(cls, path: Path | str, capacity: int, error_rate: float) -> 'BloomFilter':
+        n_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        n_bits = (n_bits + 8 * _PAGE - 1) // (8 * _PAGE) * (8 * _PAGE)
+        n_hashes = max(1, round(n_bits / capacity * math.log(2)))
+
+        path = Path(path)
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, n_hashes, n_bits, capacity, 0))
+            f.truncate(_HEADER.size + n_bits // 8)
+        tmp.replace(path)
+
+        return cls(path)
+
+
+    @property
+    def count(self) -> int:
+        return _HEADER.unpack_from(self._mm)[-1]
+
+
+    def __positions(self, key: str):
+        h1, h2 = _hashes(key)
+        return ((h1 + i * h2) % self.n_bits for i in range(self.n_hashes))
+
+
+    def __contains__(self, key: str) -> bool:
+        mm = self._mm
+        return all(
+            mm[_HEADER.size + (pos >> 3)] & (1 << (pos & 7))
+            for pos in self.__positions(key)
+        )
+
+
+    def add(self, key: str) -> None:
+        mm = self._mm
+        for pos in self.__positions(key):
+            i = _HEADER.size + (pos >> 3)
+            mm[i] = mm[i] | (1 << (pos & 7))
+        struct.pack_into('<Q', mm, _HEADER.size - 8, self.count + 1)
+
+
+    def flush(self) -> None:
+        if not self.readonly:
+            self._mm.flush()
+
+
+    def close(self) -> None:
+        self.flush()
+        self._mm.close()
+
+
+class ScalableBloomFilter:
+    """Series of bloom filters under a directory, a new and larger filter is
+    appended each time the last one is full so that the false positive rate
+    stays bounded whatever the number of news id.
+
+    Several processes can share the directory: additions and the creation of
+    the next filter hold an exclusive lock on `directory/.lock`, and the
+    filters created by the other processes are picked up on the way. Workers
+    map the filters read-only and write their keys in one go with `update`.
+
+    Args:
+        `directory`:  where the filters are stored as `0000.bloom`, `0001.bloom`, ...
+        `capacity`:   number of keys of the first filter
+        `error_rate`: false positive rate of the first filter, halved for every next one
+        `growth`:     capacity ratio between two successive filters
+        `readonly`:   map the filters read-only, used by workers sharing the directory
+    """
+    def __init__(self,
+                 directory: Path | str,
+                 capacity: int      = 1_000_000,
+                 error_rate: float  = 1e-3,
+                 growth: int        = 2,
+                 readonly: bool     = False
+                ) -> None:
+        self.directory = Path(directory)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.readonly = readonly
+
+        if not readonly:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.filters: List[BloomFilter] = []
+        self.__refresh()
+
+
+    def __refresh(self) -> None:
+        """Open the filters appended since, filters are never replaced."""
+        files = sorted(self.directory.glob('*.bloom'))
+        for file in files[len(self.filters):]:
+            self.filters.append(BloomFilter(file, self.readonly))
+
+
+    @contextmanager
+    def __locked(self) -> Iterator[None]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / '.lock', 'a+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+    def __contains__(self, key: str) -> bool:
+        return any(key in f for f in reversed(self.filters))
+
+
+    def __len__(self) -> int:
+        return sum(f.count for f in self.filters)
+
+
+    def __add(self, key: str) -> None:
+        # the lock is held
+        self.__refresh()
+        if len(self.filters) == 0 or self.filters[-1].count >= self.filters[-1].capacity:
+            i = len(self.filters)
+            self.filters.append(BloomFilter.create(
+                self.directory / f'{i:04d}.bloom',
+                self.capacity * self.growth ** i,
+                self.error_rate / 2 ** i
+            ))
+            logger.info(f'add bloom filter {i} to {self.directory}')
+
+        self.filters[-1].add(key)
+
+
+    def add(self, key: str) -> None:
+        if self.readonly:
+            raise RuntimeError('the filter is read-only, use `update`')
+
+        with self.__locked():
+            self.__add(key)
+
+
+    def update(self, keys: Iterable[str]) -> None:
+        """Add several keys under a single lock, read-only instances map the
+        filters read-write for the time of the call."""
+        with self.__locked():
+            writer = (
+                ScalableBloomFilter(self.directory, self.capacity, self.error_rate, self.growth)
+                if self.readonly
+                else
+                self
+            )
+            for key in keys:
+                writer.__add(key)
+            if writer is not self:
+                writer.close()
+            self.__refresh()
+
+
+    def close(self) -> None:
+        for f in self.filters:
+            f.close()
+
+
+class SeenSet:
+    """Skip-if-seen check: a bloom filter backed by an exact lookup.
+
+    The exact `exists` lookup (typically a query on the storage) only runs
+    when the filter reports a possible hit, so false positives never skip an
+    article and the common "never seen" case costs no query. With a read-only
+    filter, the added keys are written by `close`.
+    """
+    def __init__(self,
+                 bloom: ScalableBloomFilter,
+                 exists: Callable[[str], bool]
+                ) -> None:
+        self.bloom = bloom
+        self.exists = exists
+        self.n_maybe = 0
+        self.n_seen = 0
+        self.pending: List[str] = []
+
+
+    def seen(self, news_id: str) -> bool:
+        if news_id not in self.bloom:
+            return False
+
+        self.n_maybe += 1
+        if self.exists(news_id):
+            self.n_seen += 1
+            return True
+        return False
+
+
+    def add(self, news_id: str) -> None:
+        if self.bloom.readonly:
+            self.pending.append(news_id)
+        else:
+            self.bloom.add(news_id)
+
+
+    def close(self) -> None:
+        if len(self.pending) > 0:
+            self.bloom.update(self.pending)
+            self.pending.clear()
+        logger.info(
+            f'seen set: {self.n_seen} skipped, '
+            f'{self.n_maybe - self.n_seen} false positives'
+        )
+        self.bloom.close()
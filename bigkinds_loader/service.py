@@ -0,0 +1,246 @@
+from datetime import datetime, timezone
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from loguru import logger
+import orjson
+import os
+from pathlib import Path
+import queue
+import socketserver
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+_STOP = object()
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'bigkinds-loader'
+    service: 'Service'
+
+
+    def address_string(self) -> str:
+        # unix sockets have no client address
+        return str(self.client_address[0]) if isinstance(self.client_address, tuple) else 'unix'
+
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(f'{self.address_string()} {format % args}')
+
+
+    def _reply(self, status: HTTPStatus, body: Any) -> None:
+        data = orjson.dumps(body, default=str)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+    def _route(self) -> Tuple[str, Optional[str]]:
+        parts = [part for part in self.path.split('?')[0].split('/') if part != '']
+        return (
+            parts[0] if len(parts) > 0 else '',
+            parts[1] if len(parts) > 1 else None
+        )
+
+
+    def do_GET(self) -> None:
+        resource, id = self._route()
+        if resource == 'health':
+            self._reply(HTTPStatus.OK, self.service.health())
+        elif resource == 'jobs' and id is None:
+            self._reply(HTTPStatus.OK, self.service.jobs())
+        elif resource == 'jobs' and (job := self.service.job(id)) is not None:
+            self._reply(HTTPStatus.OK, job)
+        else:
+            self._reply(HTTPStatus.NOT_FOUND, {'error': f'not found: {self.path}'})
+
+
+    def do_POST(self) -> None:
+        resource, _ = self._route()
+        if resource != 'jobs':
+            self._reply(HTTPStatus.NOT_FOUND, {'error': f'not found: {self.path}'})
+            return
+        try:
+            request = orjson.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            if not isinstance(request, dict):
+                raise ValueError('the job has to be a JSON object')
+        except ValueError as e:
+            self._reply(HTTPStatus.BAD_REQUEST, {'error': str(e)})
+            return
+        self._reply(HTTPStatus.ACCEPTED, self.service.submit(request))
+
+
+    def do_DELETE(self) -> None:
+        resource, id = self._route()
+        if resource != 'jobs' or self.service.job(id) is None:
+            self._reply(HTTPStatus.NOT_FOUND, {'error': f'not found: {self.path}'})
+        elif self.service.cancel(id):
+            self._reply(HTTPStatus.OK, self.service.job(id))
+        else:
+            self._reply(HTTPStatus.CONFLICT, {'error': 'the job already started'})
+
+
+class Service:
+    """Long-lived process running jobs submitted through a small HTTP API.
+
+    The event loop and http clients of the engine, the mongodb client, the
+    browser of a `Scraper(keep_browser=True)` and every other resource
+    owned by `handler` stay warm across jobs, so short jobs don't pay for a
+    new container, interpreter and connections each time.
+
+    Jobs are run one at a time, in submission order, by a single worker
+    thread (the engine loop and playwright are bound to the thread using
+    them). The API listens on `host:port`, or on the unix socket `socket_path`:
+
+        POST   /jobs       submit a job (JSON object passed to `handler`)
+        GET    /jobs       every job
+        GET    /jobs/<id>  state, timestamps, result or error of a job
+        DELETE /jobs/<id>  cancel a job which hasn't started
+        GET    /health     queue depth and job counts per state
+
+    Args:
+        `handler`:     runs a job, its return value is kept as the result
+        `history`:     number of finished jobs kept for `GET /jobs`
+        `on_stop`:     called by the worker thread once the queue is stopped,
+                       to release what `handler` opened on that thread
+    """
+    def __init__(self,
+                 handler: Callable[[Dict], Any],
+                 host: str                   = '127.0.0.1',
+                 port: int                   = 8765,
+                 socket_path: Optional[str]  = None,
+                 history: int                = 1000,
+                 on_stop: Optional[Callable[[], Any]] = None
+                ) -> None:
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.history = history
+        self.on_stop = on_stop
+
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.records: Dict[str, Dict] = {}
+        self.ids = count(1)
+        self.worker = threading.Thread(target=self.__run, daemon=True)
+        self.server: Optional[socketserver.BaseServer] = None
+
+
+    def submit(self, request: Dict) -> Dict:
+        with self.lock:
+            id = str(next(self.ids))
+            self.records[id] = {
+                'id': id,
+                'request': request,
+                'state': 'queued',
+                'submitted': datetime.now(timezone.utc)
+            }
+            record = dict(self.records[id])
+        self.queue.put(id)
+        logger.info(f'job {id} submitted: {request}')
+        return record
+
+
+    def cancel(self, id: str) -> bool:
+        with self.lock:
+            record = self.records[id]
+            if record['state'] != 'queued':
+                return False
+            record['state'] = 'cancelled'
+            return True
+
+
+    def job(self, id: Optional[str]) -> Optional[Dict]:
+        with self.lock:
+            record = self.records.get(id)
+            return None if record is None else dict(record)
+
+
+    def jobs(self) -> List[Dict]:
+        with self.lock:
+            return [dict(record) for record in self.records.values()]
+
+
+    def health(self) -> Dict:
+        with self.lock:
+            states = {}
+            for record in self.records.values():
+                states[record['state']] = states.get(record['state'], 0) + 1
+        return {'status': 'ok', 'pid': os.getpid(), 'queued': self.queue.qsize(), 'jobs': states}
+
+
+    def __prune(self) -> None:
+        finished = [
+            id
+            for id, record in self.records.items()
+            if record['state'] in ('done', 'failed', 'cancelled')
+        ]
+        for id in finished[:max(len(finished) - self.history, 0)]:
+            del self.records[id]
+
+
+    def __run(self) -> None:
+        while (id := self.queue.get()) is not _STOP:
+            with self.lock:
+                record = self.records[id]
+                if record['state'] != 'queued':
+                    continue
+                record['state'] = 'running'
+                record['started'] = datetime.now(timezone.utc)
+
+            logger.info(f'job {id} started')
+            try:
+                result = self.handler(record['request'])
+            except BaseException as e:
+                # SystemExit included, a job must not take the service down
+                logger.exception(f'job {id} failed')
+                update = {'state': 'failed', 'error': repr(e)}
+            else:
+                logger.info(f'job {id} done')
+                update = {'state': 'done', 'result': result}
+
+            with self.lock:
+                record.update(update, finished=datetime.now(timezone.utc))
+                self.__prune()
+
+        if self.on_stop is not None:
+            try:
+                self.on_stop()
+            except Exception:
+                logger.exception('on_stop failed')
+
+
+    def serve_forever(self) -> None:
+        handler = type('Handler', (_Handler,), {'service': self})
+        if self.socket_path is not None:
+            Path(self.socket_path).unlink(missing_ok=True)
+            self.server = _UnixHTTPServer(self.socket_path, handler)
+            address = self.socket_path
+        else:
+            self.server = ThreadingHTTPServer((self.host, self.port), handler)
+            address = f'http://{self.host}:{self.port}'
+
+        self.worker.start()
+        logger.info(f'serve on {address}')
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            self.queue.put(_STOP)
+            self.worker.join()
+            if self.socket_path is not None:
+                Path(self.socket_path).unlink(missing_ok=True)
+
+
+    def shutdown(self) -> None:
+        """Stop `serve_forever` from another thread, the running job finishes first."""
+        if self.server is not None:
+            self.server.shutdown()
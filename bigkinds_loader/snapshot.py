@@ -0,0 +1,153 @@
+from datetime import datetime
+import gzip
+from hashlib import blake2b
+from loguru import logger
+import orjson
+from pathlib import Path
+from pymongo import MongoClient
+from typing import Dict, Generator, List, Optional, Sequence, Set, Tuple
+
+from .layout import Layout
+from .parquet import fingerprint
+from .reader import NewsReader
+from .work_queue import split_period
+
+
+SNAPSHOT_MANIFEST = 'manifest.json'
+
+
+def chunk_path(output_dir: Path | str, press: str, day: str, digest: str) -> Path:
+    """`{output_dir}/{press}/{yyyy-mm}/{dd}/{digest}.jsonl.gz`"""
+    return Path(output_dir) / press / day[:7] / day[8:] / f'{digest}.jsonl.gz'
+
+
+def _key(doc: Dict) -> Tuple[str, str, int]:
+    return doc.get('news_id', ''), doc.get('content_hash', ''), doc.get('revision', 0)
+
+
+def _read_chunk(file: Path) -> List[Dict]:
+    return [orjson.loads(line) for line in gzip.decompress(file.read_bytes()).splitlines()]
+
+
+def _write_chunk(output_dir: Path, press: str, day: str, docs: List[Dict]) -> Dict:
+    data = b''.join(
+        orjson.dumps(doc, option=orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE)
+        for doc in sorted(docs, key=lambda doc: doc['news_id'])
+    )
+    digest = blake2b(data, digest_size=16).hexdigest()
+    file = chunk_path(output_dir, press, day, digest)
+    # same digest, same bytes: an existing chunk is never rewritten
+    if not file.exists():
+        file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = file.with_suffix('.tmp')
+        tmp.write_bytes(gzip.compress(data, mtime=0))
+        tmp.replace(file)
+    return {
+        'file': str(file.relative_to(output_dir)),
+        'digest': digest,
+        'rows': len(docs)
+    }
+
+
+def export_snapshot(press: str,
+                    begin: str,
+                    end: str,
+                    output_dir: Path | str        = 'data/snapshot',
+                    fields: Sequence[str]         = ('title', 'content'),
+                    layout: Layout                = 'daily',
+                    db_name: Optional[str]        = None,
+                    client: Optional[MongoClient] = None,
+                    batch_size: int               = 1000
+                   ) -> Dict[str, int]:
+    """Append the articles of a press and period to a content-addressed snapshot.
+
+    Every day gets a list of immutable chunks, gzipped JSONL files named
+    after the digest of their content under `{press}/{yyyy-mm}/{dd}/`, and
+    `{output_dir}/manifest.json` keeps the chunks and the `fingerprint` of
+    every day. A day whose fingerprint changed gets one more chunk holding
+    only the new or revalidated articles, the others are left untouched. So,
+    tracked with `dvc add data/snapshot` in place of the mongodb data
+    directory, a commit hashes and pushes the new chunks only.
+
+    Readers keep the last version of every news id (`read_snapshot`). Articles
+    deleted from mongodb stay in the snapshot.
+
+    Args:
+        `press`:      the press of the newspaper
+        `begin`:      begin date
+        `end`:        end date
+        `output_dir`: root of the snapshot
+        `fields`:     fields stored besides `news_id`, `date`, `content_hash` and `revision`
+        `layout`:     storage layout, see `layout.get_collection`
+        `db_name`:    name of the mongodb database
+
+    Returns:
+        the number of appended chunks, of their rows and of unchanged days
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_file = output_dir / SNAPSHOT_MANIFEST
+    manifest = orjson.loads(manifest_file.read_bytes()) if manifest_file.exists() else {}
+
+    reader = NewsReader(client, batch_size, layout=layout)
+    columns = ['news_id', 'date', 'content_hash', 'revision', *fields]
+    counts = {'chunks': 0, 'rows': 0, 'skipped': 0}
+    for day, _ in split_period(begin, end):
+        key = f'{press}/{day}'
+        n, digest = fingerprint(reader, press, day, day, db_name)
+        entry = manifest.get(key, {'chunks': []})
+        if entry.get('fingerprint', '') == digest or (n == 0 and key not in manifest):
+            counts['skipped'] += 1
+            continue
+
+        known: Set[Tuple[str, str, int]] = {
+            _key(doc)
+            for chunk in entry['chunks']
+            for doc in _read_chunk(output_dir / chunk['file'])
+        }
+        docs = [
+            doc
+            for batch in reader.read(press, day, day, columns, db_name=db_name)
+            for doc in batch
+            if _key(doc) not in known
+        ]
+        if len(docs) > 0:
+            chunk = _write_chunk(output_dir, press, day, docs)
+            entry['chunks'].append(chunk | {'written': datetime.now().isoformat(timespec='seconds')})
+            counts['chunks'] += 1
+            counts['rows'] += len(docs)
+            logger.info(f'snapshot {key}: {len(docs)} rows to {chunk["file"]}')
+        entry.update(fingerprint=digest, rows=n)
+        manifest[key] = entry
+
+        # after every day, an interrupted run keeps what it wrote
+        tmp = manifest_file.with_suffix('.json.tmp')
+        tmp.write_bytes(orjson.dumps(manifest, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
+        tmp.replace(manifest_file)
+
+    logger.info(f'snapshot {press} {begin}/{end}: {counts}')
+    return counts
+
+
+def read_snapshot(output_dir: Path | str,
+                  press: str,
+                  begin: str,
+                  end: str
+                 ) -> Generator[List[Dict], None, None]:
+    """Yield the articles of every day of the snapshot, one list per day, with
+    the last version of every news id."""
+    output_dir = Path(output_dir)
+    manifest_file = output_dir / SNAPSHOT_MANIFEST
+    if not manifest_file.exists():
+        return
+    manifest = orjson.loads(manifest_file.read_bytes())
+
+    for day, _ in split_period(begin, end):
+        entry = manifest.get(f'{press}/{day}')
+        if entry is None:
+            continue
+        docs = {}
+        for chunk in entry['chunks']:
+            for doc in _read_chunk(output_dir / chunk['file']):
+                docs[doc['news_id']] = doc
+        yield list(docs.values())
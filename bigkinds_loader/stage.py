@@ -0,0 +1,116 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Deque, Dict, List, Optional, Sequence
+
+from .enrich import enrich_batch
+from .normalize import normalize_batch
+
+
+BatchFunc = Callable[[List[Dict]], List[Dict]]
+
+
+def pipeline_stages(enrich: bool       = False,
+                    normalize: bool    = False,
+                    strip_byline: bool = False,
+                    strip_email: bool  = False
+                   ) -> List[BatchFunc]:
+    """Transforms of the fetched articles, shared by the crawl and `redrive`,
+    see `Scraper.get_news_batch`."""
+    stages = [enrich_batch] if enrich else []
+    if normalize:
+        stages.append(partial(
+            normalize_batch,
+            strip_byline=strip_byline,
+            strip_email=strip_email
+        ))
+    return stages
+
+
+def _apply(funcs: Sequence[BatchFunc], batch: List[Dict]) -> List[Dict]:
+    for func in funcs:
+        batch = func(batch)
+    return batch
+
+
+class BatchStage:
+    """Run CPU-bound transforms on batches of documents in a process pool.
+
+    Documents are grouped into batches of `batch_size`, every batch goes
+    through `funcs` (module level functions, so that they can be pickled) in a
+    worker process, and the results are streamed to `sink` in submission
+    order. At most `max_pending` batches are in flight, beyond that `put`
+    waits for the oldest one. Without any function documents go straight to
+    `sink`.
+
+    Args:
+        `funcs`:       transforms applied in order, each maps a batch to a batch
+        `sink`:        called with every transformed document
+        `batch_size`:  number of documents per batch
+        `processes`:   size of the process pool
+        `max_pending`: number of batches in flight, default to 2 * `processes`
+    """
+    def __init__(self,
+                 funcs: Sequence[BatchFunc],
+                 sink: Callable[[Dict], None],
+                 batch_size: int             = 100,
+                 processes: int              = 2,
+                 max_pending: Optional[int]  = None
+                ) -> None:
+        self.funcs = list(funcs)
+        self.sink = sink
+        self.batch_size = batch_size
+        self.max_pending = max_pending if max_pending is not None else 2 * processes
+
+        self.pool = (
+            ProcessPoolExecutor(processes)
+            if len(self.funcs) > 0
+            else
+            None
+        )
+        self.buffer: List[Dict] = []
+        self.pending: Deque[Future] = deque()
+
+
+    def __enter__(self) -> 'BatchStage':
+        return self
+
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+    def __emit(self, future: Future) -> None:
+        for doc in future.result():
+            self.sink(doc)
+
+
+    def __submit(self) -> None:
+        self.pending.append(self.pool.submit(_apply, self.funcs, self.buffer))
+        self.buffer = []
+
+        while len(self.pending) > 0 and (
+            self.pending[0].done() or len(self.pending) > self.max_pending
+        ):
+            self.__emit(self.pending.popleft())
+
+
+    def put(self, doc: Dict) -> None:
+        if self.pool is None:
+            self.sink(doc)
+            return
+
+        self.buffer.append(doc)
+        if len(self.buffer) >= self.batch_size:
+            self.__submit()
+
+
+    def close(self) -> None:
+        if self.pool is None:
+            return
+
+        if len(self.buffer) > 0:
+            self.__submit()
+        while len(self.pending) > 0:
+            self.__emit(self.pending.popleft())
+        self.pool.shutdown()
@@ -0,0 +1,188 @@
+from collections import defaultdict
+import csv
+from datetime import datetime, timezone
+from loguru import logger
+from pathlib import Path
+from pymongo import ASCENDING, MongoClient, UpdateOne
+from pymongo.collection import Collection
+from typing import Dict, Iterable, List, Literal, Optional
+
+from .layout import parse_date
+from .reader import NewsReader
+
+
+SUMMARY_COLLECTION = 'daily_summary'
+
+SUMMARY_FIELDS = ('press', 'date', 'count', 'chars', 'mean_chars', 'first', 'last', 'failures')
+
+
+class DailySummary:
+    """Materialized per press and day statistics of the ingested articles.
+
+    A document per (press, day) holds the number of articles, their total
+    number of characters, the first and last publication timestamps and the
+    number of failed fetches. It's updated incrementally from the `on_commit`
+    callback of the writer, which only sees newly inserted articles, so
+    re-running a period doesn't count its articles twice.
+    """
+    def __init__(self, collection: Collection) -> None:
+        self.collection = collection
+
+
+    @classmethod
+    def from_db(cls, client: MongoClient, db_name: str) -> 'DailySummary':
+        return cls(client[db_name][SUMMARY_COLLECTION])
+
+
+    def ensure_indexes(self) -> None:
+        self.collection.create_index([('press', ASCENDING), ('date', ASCENDING)])
+
+
+    def __update(self, press: str, day: str, inc: Dict, first=None, last=None) -> UpdateOne:
+        update = {
+            '$inc': inc,
+            '$set': {'updated': datetime.now(timezone.utc)},
+            '$setOnInsert': {'press': press, 'date': day, 'month': day[:7]}
+        }
+        if first is not None:
+            update['$min'] = {'first': first}
+            update['$max'] = {'last': last}
+        return UpdateOne({'_id': f'{press}:{day}'}, update, upsert=True)
+
+
+    def add(self, docs: Iterable[Dict], press: str) -> None:
+        """Account for a batch of newly stored articles, usable as `on_commit`."""
+        days = defaultdict(lambda: {'count': 0, 'chars': 0, 'first': None, 'last': None})
+        for doc in docs:
+            date = doc.get('date')
+            if not isinstance(date, datetime):
+                date = parse_date(date or '', doc.get('news_id'))
+            if date is None:
+                continue
+            stats = days[date.strftime('%Y-%m-%d')]
+            stats['count'] += 1
+            stats['chars'] += len(doc.get('content') or '')
+            stats['first'] = date if stats['first'] is None else min(stats['first'], date)
+            stats['last'] = date if stats['last'] is None else max(stats['last'], date)
+
+        if len(days) > 0:
+            self.collection.bulk_write([
+                self.__update(
+                    press,
+                    day,
+                    {'count': stats['count'], 'chars': stats['chars']},
+                    stats['first'],
+                    stats['last']
+                )
+                for day, stats in days.items()
+            ], ordered=False)
+
+
+    def add_failures(self, failures: Dict[str, int], press: str) -> None:
+        """Account for the failed fetches of every day."""
+        if len(failures) > 0:
+            self.collection.bulk_write([
+                self.__update(press, day, {'failures': n})
+                for day, n in failures.items()
+            ], ordered=False)
+
+
+    def add_chars(self, chars: Dict[str, int], press: str) -> None:
+        """Account for the change of characters of every day, e.g. of revalidated articles."""
+        chars = {day: n for day, n in chars.items() if n != 0}
+        if len(chars) > 0:
+            self.collection.bulk_write([
+                self.__update(press, day, {'chars': n})
+                for day, n in chars.items()
+            ], ordered=False)
+
+
+    def query(self,
+              press: Optional[str] = None,
+              begin: Optional[str] = None,
+              end: Optional[str]   = None,
+              freq: Literal['day', 'month'] = 'day'
+             ) -> List[Dict]:
+        """Statistics of every press and day (or month) of [`begin`, `end`].
+
+        Every row has the press, the date (`yyyy-mm-dd` or `yyyy-mm`), the
+        count, total and mean characters, first and last timestamps and the
+        number of failed fetches.
+        """
+        filter = {}
+        if press is not None:
+            filter['press'] = press
+        if begin is not None or end is not None:
+            filter['date'] = {}
+            if begin is not None:
+                filter['date']['$gte'] = begin
+            if end is not None:
+                filter['date']['$lte'] = end
+
+        return [
+            {
+                'press': row['_id']['press'],
+                'date': row['_id']['date'],
+                'count': row['count'],
+                'chars': row['chars'],
+                'mean_chars': row['chars'] / row['count'] if row['count'] > 0 else 0.,
+                'first': row['first'],
+                'last': row['last'],
+                'failures': row['failures']
+            }
+            for row in self.collection.aggregate([
+                {'$match': filter},
+                {
+                    '$group': {
+                        '_id': {'press': '$press', 'date': '$date' if freq == 'day' else '$month'},
+                        'count': {'$sum': {'$ifNull': ['$count', 0]}},
+                        'chars': {'$sum': {'$ifNull': ['$chars', 0]}},
+                        'first': {'$min': '$first'},
+                        'last': {'$max': '$last'},
+                        'failures': {'$sum': {'$ifNull': ['$failures', 0]}}
+                    }
+                },
+                {'$sort': {'_id.press': 1, '_id.date': 1}}
+            ])
+        ]
+
+
+    def report(self,
+               press: Optional[str],
+               begin: Optional[str],
+               end: Optional[str],
+               freq: Literal['day', 'month'] = 'day',
+               output_dir: Path | str        = 'data/summary'
+              ) -> List[Dict]:
+        """`query` written to `{output_dir}/{press}_{begin}_{end}_{freq}.csv`."""
+        rows = self.query(press, begin, end, freq)
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        output_file = output_dir / f'{press or "all"}_{begin}_{end}_{freq}.csv'
+        with open(output_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+        logger.info(
+            f'{press or "all"} {begin}/{end}: {sum(row["count"] for row in rows)} articles, '
+            f'{sum(row["failures"] for row in rows)} failures over {len(rows)} rows, '
+            f'written to {output_file}'
+        )
+        return rows
+
+
+    def rebuild(self,
+                reader: NewsReader,
+                press: str,
+                begin: str,
+                end: str,
+                db_name: Optional[str] = None
+               ) -> None:
+        """Recompute the article statistics of [`begin`, `end`] from the stored
+        articles, e.g. for the data ingested before the summary existed. The
+        failure counts of the period are lost.
+        """
+        self.collection.delete_many({'press': press, 'date': {'$gte': begin, '$lte': end}})
+        for batch in reader.read(press, begin, end, ['news_id', 'date', 'content'], db_name=db_name):
+            self.add(batch, press)
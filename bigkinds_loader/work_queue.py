@@ -0,0 +1,327 @@
+from datetime import datetime, timedelta, timezone
+from loguru import logger
+import os
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.collection import Collection
+import socket
+import threading
+from typing import Callable, Dict, Generator, List, Optional, Tuple
+
+
+# priority classes, claimed from the highest down
+PRIORITY = {'backfill': 0, 'daily': 10}
+
+
+def split_period(begin: str,
+                 end: str,
+                 days: int = 1
+                ) -> Generator[Tuple[str, str], None, None]:
+    """Split the closed interval [`begin`, `end`] into shards of `days` days."""
+    begin_date = datetime.strptime(begin, '%Y-%m-%d')
+    end_date = datetime.strptime(end, '%Y-%m-%d')
+
+    while begin_date <= end_date:
+        shard_end = min(begin_date + timedelta(days - 1), end_date)
+        yield begin_date.strftime('%Y-%m-%d'), shard_end.strftime('%Y-%m-%d')
+        begin_date = shard_end + timedelta(1)
+
+
+class _Heartbeat(threading.Thread):
+    """Renew the lease of a claimed job until it is stopped."""
+    def __init__(self, queue: 'WorkQueue', job: Dict) -> None:
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.job = job
+        self.stopped = threading.Event()
+        self.lost = False
+
+
+    def run(self) -> None:
+        interval = max(self.queue.lease_seconds / 3, 1)
+        while not self.stopped.wait(interval):
+            if not self.queue.heartbeat(self.job):
+                logger.warning(f'lease lost: {self.job["_id"]}')
+                self.lost = True
+                return
+
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join()
+
+
+class WorkQueue:
+    """Lease-based queue of (press, period) shards shared by several nodes.
+
+    Every job is a document in a mongodb collection. Workers claim a job with
+    an atomic `find_one_and_update`, renew the lease through a heartbeat
+    while crawling, and a job whose lease expires (the node died) becomes
+    claimable again.
+
+    Jobs are claimed by priority class first, so daily work enqueued with
+    `priority='daily'` overtakes a running backfill at its next shard
+    boundary. Within a class, presses get a weighted fair share of the
+    claims: every claim charges `1 / weight` to the virtual time of its press
+    (kept in the `{collection}_shares` collection), and the press with the
+    lowest virtual time goes next.
+
+    Args:
+        `weights`: share of every press, default to 1
+    """
+    def __init__(self,
+                 collection: Collection,
+                 lease_seconds: int                  = 600,
+                 max_attempts: int                   = 5,
+                 worker_id: Optional[str]            = None,
+                 weights: Optional[Dict[str, float]] = None
+                ) -> None:
+        self.collection = collection
+        self.shares = collection.database[f'{collection.name}_shares']
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.weights = {} if weights is None else dict(weights)
+        self.worker_id = (
+            worker_id
+            if worker_id is not None
+            else
+            f'{socket.gethostname()}:{os.getpid()}'
+        )
+
+
+    def ensure_indexes(self) -> None:
+        self.collection.create_index([('state', ASCENDING), ('created', ASCENDING)])
+        self.collection.create_index([
+            ('state', ASCENDING),
+            ('priority', DESCENDING),
+            ('press', ASCENDING),
+            ('created', ASCENDING)
+        ])
+        self.collection.create_index([('state', ASCENDING), ('lease_expires', ASCENDING)])
+
+
+    def enqueue(self,
+                press: str | List[str],
+                begin: str,
+                end: str,
+                shard_days: int                = 1,
+                db_name: Optional[str]         = None,
+                collection_name: Optional[str] = None,
+                priority: str                  = 'backfill'
+               ) -> int:
+        """Split the period into shards and insert the missing ones.
+
+        The job id is `{press}:{begin}:{end}` so enqueueing the same range
+        twice doesn't duplicate work, a pending shard enqueued again with a
+        higher `priority` is promoted.
+
+        Returns:
+            the number of newly inserted jobs
+        """
+        self.ensure_indexes()
+        n_new = 0
+        for p in ([press] if isinstance(press, str) else list(press)):
+            for shard_begin, shard_end in split_period(begin, end, shard_days):
+                r = self.collection.update_one(
+                    {'_id': f'{p}:{shard_begin}:{shard_end}'},
+                    {
+                        '$setOnInsert': {
+                            'press': p,
+                            'begin': shard_begin,
+                            'end': shard_end,
+                            'db_name': db_name,
+                            'collection_name': collection_name,
+                            'state': 'pending',
+                            'attempts': 0,
+                            'created': datetime.now(timezone.utc),
+                        },
+                        '$max': {'priority': PRIORITY[priority]}
+                    },
+                    upsert=True
+                )
+                n_new += int(r.upserted_id is not None)
+
+        logger.info(f'enqueue {n_new} new jobs')
+        return n_new
+
+
+    def _claimable(self, now: datetime) -> Dict:
+        return {
+            '$or': [
+                {'state': 'pending'},
+                {
+                    'state': 'leased',
+                    'lease_expires': {'$lt': now},
+                    'attempts': {'$lt': self.max_attempts}
+                }
+            ]
+        }
+
+
+    def _park_expired(self, now: datetime) -> None:
+        """Fail the expired leases out of attempts, e.g. a shard killing its node."""
+        r = self.collection.update_many(
+            {
+                'state': 'leased',
+                'lease_expires': {'$lt': now},
+                'attempts': {'$gte': self.max_attempts}
+            },
+            {
+                '$set': {'state': 'failed', 'error': 'lease expired'},
+                '$unset': {'lease_expires': '', 'owner': ''}
+            }
+        )
+        if r.modified_count > 0:
+            logger.warning(f'{r.modified_count} jobs failed after {self.max_attempts} expired leases')
+
+
+    def _next_press(self, now: datetime) -> Optional[Tuple[Optional[int], str, float]]:
+        """Highest claimable priority, its press with the lowest virtual time
+        and the virtual time of a press without any claim."""
+        top = self.collection.find_one(
+            self._claimable(now),
+            {'priority': 1},
+            sort=[('priority', DESCENDING)]
+        )
+        if top is None:
+            return None
+
+        priority = top.get('priority')
+        presses = self.collection.distinct(
+            'press',
+            self._claimable(now) | {'priority': priority}
+        )
+        vtime = {
+            item['_id']: item['vtime']
+            for item in self.shares.find({'_id': {'$in': presses}})
+        }
+        # a press joining late starts level with the others (and goes first)
+        # instead of catching up on the claims it never competed for
+        start = min(vtime.values(), default=0.)
+        press = min(presses, key=lambda p: (vtime.get(p, start), p in vtime))
+        return priority, press, start
+
+
+    def claim(self) -> Optional[Dict]:
+        """Atomically lease a pending job, or a job whose lease expired."""
+        while True:
+            now = datetime.now(timezone.utc)
+            self._park_expired(now)
+            if (target := self._next_press(now)) is None:
+                return None
+
+            priority, press, start = target
+            job = self.collection.find_one_and_update(
+                self._claimable(now) | {'priority': priority, 'press': press},
+                {
+                    '$set': {
+                        'state': 'leased',
+                        'owner': self.worker_id,
+                        'heartbeat': now,
+                        'lease_expires': now + timedelta(seconds=self.lease_seconds)
+                    },
+                    '$inc': {'attempts': 1}
+                },
+                sort=[('created', ASCENDING)],
+                return_document=ReturnDocument.AFTER
+            )
+            # None: another worker took the last job of the press meanwhile
+            if job is not None:
+                self._charge(press, start, now)
+                return job
+
+
+    def _charge(self, press: str, start: float, now: datetime) -> None:
+        self.shares.update_one(
+            {'_id': press},
+            [{
+                '$set': {
+                    'vtime': {
+                        '$add': [
+                            {'$ifNull': ['$vtime', start]},
+                            1 / self.weights.get(press, 1.)
+                        ]
+                    },
+                    'updated': now
+                }
+            }],
+            upsert=True
+        )
+
+
+    def heartbeat(self, job: Dict) -> bool:
+        """Extend the lease, returning False if another worker took it over."""
+        now = datetime.now(timezone.utc)
+        r = self.collection.update_one(
+            {'_id': job['_id'], 'state': 'leased', 'owner': self.worker_id},
+            {
+                '$set': {
+                    'heartbeat': now,
+                    'lease_expires': now + timedelta(seconds=self.lease_seconds)
+                }
+            }
+        )
+        return r.matched_count == 1
+
+
+    def complete(self, job: Dict) -> None:
+        self.collection.update_one(
+            {'_id': job['_id'], 'owner': self.worker_id},
+            {
+                '$set': {'state': 'done', 'finished': datetime.now(timezone.utc)},
+                '$unset': {'lease_expires': ''}
+            }
+        )
+
+
+    def fail(self, job: Dict, error: str) -> None:
+        """Release the job for a retry, or park it after `max_attempts`."""
+        state = 'failed' if job.get('attempts', 0) >= self.max_attempts else 'pending'
+        self.collection.update_one(
+            {'_id': job['_id'], 'owner': self.worker_id},
+            {
+                '$set': {'state': state, 'error': error},
+                '$unset': {'lease_expires': '', 'owner': ''}
+            }
+        )
+
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            item['_id']: item['count']
+            for item in self.collection.aggregate([
+                {'$group': {'_id': '$state', 'count': {'$sum': 1}}}
+            ])
+        }
+
+
+    def drain(self, handler: Callable[[Dict], None]) -> int:
+        """Claim and run jobs until the queue is empty.
+
+        Args:
+            `handler`: called with the job document, raising (or exiting) marks the
+                       job as failed
+
+        Returns:
+            the number of jobs completed by this worker
+        """
+        n_done = 0
+        while (job := self.claim()) is not None:
+            logger.info(f'{self.worker_id} claim {job["_id"]} (attempt {job["attempts"]})')
+            heartbeat = _Heartbeat(self, job)
+            heartbeat.start()
+            try:
+                handler(job)
+            except BaseException as e:
+                # SystemExit included, the playwright id generator exits on a day without pages
+                heartbeat.stop()
+                logger.exception(f'job failed: {job["_id"]}')
+                self.fail(job, repr(e))
+                if isinstance(e, KeyboardInterrupt):
+                    raise
+            else:
+                heartbeat.stop()
+                if not heartbeat.lost:
+                    self.complete(job)
+                    n_done += 1
+
+        return n_done
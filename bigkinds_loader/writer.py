@@ -0,0 +1,167 @@
+from loguru import logger
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .layout import is_time_series
+
+
+_STOP = object()
+
+
+class MongoWriter:
+    """Insert documents into mongodb from a dedicated writer thread.
+
+    Producers `put` documents into a bounded queue and the writer thread
+    drains it with batched `insert_many`. When mongodb slows down the queue
+    fills up and `put` blocks, so fetching slows down with the storage
+    instead of freezing on every single insert.
+
+    Args:
+        `collection`:     target collection
+        `batch_size`:     maximum number of documents per `insert_many`
+        `queue_size`:     depth of the queue between producers and the writer
+        `flush_interval`: seconds to wait for a batch to fill up before writing it
+        `key`:            field used as `_id`, making re-runs of a period idempotent
+        `on_commit`:      called from the writer thread with every batch of newly
+                          inserted documents, e.g. to maintain secondary indexes
+        `dedupe`:         look the `news_id` of every batch up and skip the stored
+                          ones before inserting, default to a time series
+                          `collection`, whose `_id` isn't unique so duplicates
+                          aren't rejected (writers racing on the same period
+                          may still both insert an article)
+    """
+    def __init__(self,
+                 collection: Collection,
+                 batch_size: int       = 100,
+                 queue_size: int       = 1000,
+                 flush_interval: float = 1.,
+                 key: Optional[str]    = 'news_id',
+                 on_commit: Sequence[Callable[[List[Dict]], None]] = (),
+                 dedupe: Optional[bool] = None
+                ) -> None:
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.key = key
+        self.on_commit = list(on_commit)
+        self.dedupe = dedupe
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.error: Optional[BaseException] = None
+
+        self.n_written = 0
+        self.n_blocked = 0
+        self.blocked_seconds = 0.
+
+
+    def __enter__(self) -> 'MongoWriter':
+        self.start()
+        return self
+
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+    def start(self) -> None:
+        if self.dedupe is None:
+            self.dedupe = is_time_series(self.collection)
+        self.thread.start()
+
+
+    def put(self, doc: Dict) -> None:
+        """Enqueue a document, blocking while the queue is full (backpressure)."""
+        if self.error is not None:
+            raise RuntimeError('mongo writer failed') from self.error
+
+        try:
+            self.queue.put_nowait(doc)
+        except queue.Full:
+            self.n_blocked += 1
+            t0 = time.perf_counter()
+            self.queue.put(doc)
+            self.blocked_seconds += time.perf_counter() - t0
+
+
+    def close(self) -> None:
+        """Flush the remaining documents and stop the writer thread."""
+        self.queue.put(_STOP)
+        self.thread.join()
+        logger.info(
+            f'writer: {self.n_written} documents written, '
+            f'producers blocked {self.n_blocked} times ({self.blocked_seconds:.1f}s)'
+        )
+        if self.error is not None:
+            raise RuntimeError('mongo writer failed') from self.error
+
+
+    def __skip_stored(self, batch: List[Dict]) -> List[Dict]:
+        stored = {
+            doc['news_id']
+            for doc in self.collection.find(
+                {'news_id': {'$in': [doc['news_id'] for doc in batch]}},
+                {'_id': 0, 'news_id': 1}
+            )
+        }
+        unique = {}
+        for doc in batch:
+            if doc['news_id'] not in stored:
+                unique.setdefault(doc['news_id'], doc)
+        return list(unique.values())
+
+
+    def __write(self, batch: List[Dict]) -> None:
+        if self.dedupe:
+            batch = self.__skip_stored(batch)
+            if len(batch) == 0:
+                return
+        if self.key is not None:
+            for doc in batch:
+                doc.setdefault('_id', doc[self.key])
+        try:
+            self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # documents stored by a previous run of the same period
+            errors = e.details.get('writeErrors', [])
+            if any(err.get('code') != 11000 for err in errors):
+                raise
+            duplicated = {err['index'] for err in errors}
+            batch = [doc for i, doc in enumerate(batch) if i not in duplicated]
+
+        self.n_written += len(batch)
+        for callback in self.on_commit:
+            callback(batch)
+
+
+    def __run(self) -> None:
+        stop = False
+        while not stop:
+            batch = [self.queue.get()]
+            if batch[0] is _STOP:
+                break
+
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    doc = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if doc is _STOP:
+                    stop = True
+                    break
+                batch.append(doc)
+
+            try:
+                self.__write(batch)
+            except Exception as e:
+                logger.exception('fail to write the batch')
+                self.error = e
+                # keep draining so that blocked producers can notice the error
+                while self.queue.get() is not _STOP:
+                    pass
+                return
@@ -1,23 +1,209 @@
 import os, sys
 sys.path.append(os.path.abspath(os.getcwd()))
 
+from typing import Any
+
 import hydra
-from omegaconf import DictConfig
+from omegaconf import DictConfig, OmegaConf
+
+from bigkinds_loader import (
+    DailySummary,
+    DeadLetters,
+    NewsReader,
+    Scraper,
+    Service,
+    WorkQueue,
+    enumerate_ids,
+    export_parquet,
+    export_snapshot,
+    get_engine,
+    init_engine,
+    migrate,
+    plan,
+    redrive,
+    revalidate
+)
 
-from bigkinds_loader import Scraper
+
+def get_queue(cfg: DictConfig) -> WorkQueue:
+    client = get_engine().mongo()
+    return WorkQueue(
+        client[cfg.queue.db_name][cfg.queue.collection],
+        cfg.queue.lease_seconds,
+        cfg.queue.max_attempts,
+        weights=cfg.queue.weights
+    )
+
+
+def run(cfg: DictConfig, agent: Scraper) -> Any:
+    match cfg.mode:
+        case 'crawl':
+            return agent.get_news_batch(
+                cfg.press,
+                cfg.timeout,
+                cfg.begin,
+                cfg.end,
+                cfg.db_name,
+                cfg.collection_name,
+                layout=cfg.layout,
+                time_series=cfg.time_series,
+                id_source=cfg.ids.id_source,
+                id_dir=cfg.ids.id_dir,
+                seen_dir=cfg.seen_dir,
+                fts_path=cfg.fts_path,
+                structured_log=cfg.structured_log,
+                dead_letter_db=cfg.dead_letter_db,
+                summary_db=cfg.summary.db_name,
+                proxy=cfg.proxy,
+                **cfg.rate,
+                **cfg.writer,
+                **cfg.pipeline
+            )
+        case 'enqueue':
+            return get_queue(cfg).enqueue(
+                cfg.press,
+                cfg.begin,
+                cfg.end,
+                cfg.queue.shard_days,
+                cfg.db_name,
+                priority=cfg.queue.priority
+            )
+        case 'worker':
+            return get_queue(cfg).drain(
+                lambda job: agent.get_news_batch(
+                    job['press'],
+                    cfg.timeout,
+                    job['begin'],
+                    job['end'],
+                    job['db_name'],
+                    job['collection_name'],
+                    layout=cfg.layout,
+                    time_series=cfg.time_series,
+                    id_source=cfg.ids.id_source,
+                    id_dir=cfg.ids.id_dir,
+                    seen_dir=cfg.seen_dir,
+                    fts_path=cfg.fts_path,
+                    structured_log=cfg.structured_log,
+                    dead_letter_db=cfg.dead_letter_db,
+                    summary_db=cfg.summary.db_name,
+                    proxy=cfg.proxy,
+                    **cfg.rate,
+                    **cfg.writer,
+                    **cfg.pipeline
+                )
+            )
+        case 'migrate':
+            return migrate(
+                get_engine().mongo(),
+                cfg.press,
+                cfg.layout,
+                cfg.db_name,
+                time_series=cfg.time_series,
+                **cfg.migrate
+            )
+        case 'plan':
+            return plan(
+                cfg.press,
+                cfg.begin,
+                cfg.end,
+                proxy=cfg.proxy,
+                **cfg.rate,
+                **cfg.plan
+            )
+        case 'ids':
+            return enumerate_ids(
+                cfg.press,
+                cfg.begin,
+                cfg.end,
+                cfg.ids.id_dir,
+                cfg.ids.combined,
+                cfg.ids.group_size,
+                cfg.ids.page_size,
+                cfg.ids.min_page_size,
+                proxy=cfg.proxy,
+                **cfg.rate
+            )
+        case 'revalidate':
+            return revalidate(
+                cfg.press,
+                cfg.begin,
+                cfg.end,
+                layout=cfg.layout,
+                db_name=cfg.db_name,
+                proxy=cfg.proxy,
+                strip_byline=cfg.pipeline.strip_byline,
+                strip_email=cfg.pipeline.strip_email,
+                fts_path=cfg.fts_path,
+                summary_db=cfg.summary.db_name,
+                **cfg.revalidate
+            )
+        case 'export':
+            return export_parquet(
+                cfg.press,
+                cfg.begin,
+                cfg.end,
+                layout=cfg.layout,
+                db_name=cfg.db_name,
+                **cfg.export
+            )
+        case 'snapshot':
+            return export_snapshot(
+                cfg.press,
+                cfg.begin,
+                cfg.end,
+                layout=cfg.layout,
+                db_name=cfg.db_name,
+                **cfg.snapshot
+            )
+        case 'summary':
+            daily = DailySummary.from_db(get_engine().mongo(), cfg.summary.db_name)
+            if cfg.summary.rebuild:
+                daily.rebuild(
+                    NewsReader(layout=cfg.layout),
+                    cfg.press,
+                    cfg.begin,
+                    cfg.end,
+                    cfg.db_name
+                )
+            return daily.report(
+                cfg.press,
+                cfg.begin,
+                cfg.end,
+                cfg.summary.freq,
+                cfg.summary.output_dir
+            )
+        case 'redrive':
+            client = get_engine().mongo()
+            return redrive(
+                DeadLetters.from_db(client, cfg.dead_letter_db),
+                client,
+                batch_size=cfg.writer.batch_size,
+                proxy=cfg.proxy,
+                summary_db=cfg.summary.db_name,
+                fts_path=cfg.fts_path,
+                **cfg.pipeline,
+                **cfg.redrive
+            )
+        case _:
+            raise ValueError(f'unknown mode: {cfg.mode}')
 
 
 @hydra.main(config_path="../config", config_name="main", version_base=None)
 def main(cfg: DictConfig):
-    agent = Scraper()
-    agent.get_news_batch(
-        cfg.press,
-        cfg.timeout,
-        cfg.begin,
-        cfg.end,
-        cfg.db_name,
-        cfg.collection_name
-    )
+    init_engine(cfg.use_uvloop)
+    if cfg.mode == 'serve':
+        # every job is the config overridden by the submitted JSON object
+        agent = Scraper(keep_browser=cfg.service.keep_browser)
+        Service(
+            lambda request: run(OmegaConf.merge(cfg, request), agent),
+            cfg.service.host,
+            cfg.service.port,
+            cfg.service.socket_path,
+            # playwright is bound to the worker thread which launched the browser
+            on_stop=agent.close
+        ).serve_forever()
+    else:
+        run(cfg, Scraper())
 
 
 if __name__ == "__main__":
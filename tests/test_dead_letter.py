@@ -0,0 +1,152 @@
+import asyncio
+import json
+
+import httpx
+import mongomock
+import pytest
+
+from bigkinds_loader import enumerator, writer
+from bigkinds_loader.api import HEADERS
+from bigkinds_loader.dead_letter import DeadLetters, redrive
+from bigkinds_loader.engine import get_engine
+from bigkinds_loader.enumerator import enumerate_ids, id_path
+from bigkinds_loader.fts import FullTextIndex
+from bigkinds_loader.id_store import NewsIdStore
+from bigkinds_loader.summary import DailySummary
+
+
+IDS = [f'01100101.20240103{i:09d}' for i in range(250)]
+
+
+def api_transport(fail_search=lambda page: False) -> httpx.MockTransport:
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == 'GET':
+            news_id = request.url.params['docId']
+            return httpx.Response(200, json={'detail': {
+                'DATE': '2024-01-03 09:00:00',
+                'TITLE': '은행',
+                'CONTENT': f'<p>{news_id}</p>'
+            }})
+
+        body = json.loads(request.content)
+        page, size = int(body['startNo']), int(body['resultNumber'])
+        if fail_search(page):
+            return httpx.Response(500)
+        return httpx.Response(200, json={
+            'totalCount': len(IDS),
+            'resultList': [{'NEWS_ID': news_id} for news_id in IDS[(page-1)*size:page*size]]
+        })
+    return httpx.MockTransport(handler)
+
+
+def use_transport(transport: httpx.MockTransport) -> None:
+    get_engine().clients[(None, 300, tuple(sorted(HEADERS.items())))] = httpx.AsyncClient(transport=transport)
+
+
+@pytest.fixture(autouse=True)
+def setup(tmp_path, monkeypatch):
+    sleep = asyncio.sleep
+    monkeypatch.setattr(enumerator.asyncio, 'sleep', lambda seconds: sleep(0))
+    # mongomock has no `Collection.options`
+    monkeypatch.setattr(writer, 'is_time_series', lambda collection: False)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'env').mkdir()
+    (tmp_path / 'env' / 'press_code.json').write_text(json.dumps([{'press': 'A', 'code': '01100101'}]))
+
+
+def fail_page_2(client, id_dir):
+    dead_letters = DeadLetters.from_db(client, 'queue')
+    use_transport(api_transport(lambda page: page == 2))
+    enumerate_ids('A', '2024-01-03', '2024-01-03', id_dir, min_page_size=100, dead_letters=dead_letters)
+    assert dead_letters.stats() == {'search': 1}
+    return dead_letters
+
+
+def test_redrive_doesnt_save_incomplete_store(tmp_path):
+    client = mongomock.MongoClient()
+    dead_letters = fail_page_2(client, tmp_path / 'ids')
+
+    use_transport(api_transport())
+    counts = redrive(dead_letters, client, max_rate=1000, time_period=1)
+    # the page alone would pass for the whole period
+    assert not id_path(tmp_path / 'ids', 'A', '2024-01-03', '2024-01-03').exists()
+    # its news are fetched anyway
+    assert counts == {'retried': 101, 'recovered': 101, 'failed': 0}
+    assert client['A']['2024-01-03'].count_documents({}) == 100
+    assert dead_letters.stats() == {}
+
+
+def test_redrive_merges_into_saved_store(tmp_path):
+    client = mongomock.MongoClient()
+    dead_letters = fail_page_2(client, tmp_path / 'ids')
+    file = id_path(tmp_path / 'ids', 'A', '2024-01-03', '2024-01-03')
+    file.parent.mkdir(parents=True)
+    NewsIdStore.from_ids(IDS[:100] + IDS[200:]).save(file)
+
+    use_transport(api_transport())
+    redrive(dead_letters, client, max_rate=1000, time_period=1)
+    store = NewsIdStore.open(file)
+    assert list(store) == IDS
+    store.close()
+
+
+def test_redrive_runs_the_pipeline_and_summary(tmp_path):
+    client = mongomock.MongoClient()
+    dead_letters = DeadLetters.from_db(client, 'queue')
+    daily = DailySummary.from_db(client, 'stats')
+    daily.add_failures({'2024-01-03': 2}, 'A')
+    target = {
+        'press': 'A',
+        'begin': '2024-01-03',
+        'layout': 'daily',
+        'db_name': None,
+        'collection_name': None,
+        'time_series': False
+    }
+    # counted by the crawl which failed it, unlike the news of a failed search page
+    dead_letters.add_news(IDS[0], target | {'summary_db': 'stats'}, 'HTTPStatus', 500)
+    dead_letters.add_news(IDS[1], target, 'Unfetched')
+
+    use_transport(api_transport())
+    redrive(
+        dead_letters,
+        client,
+        summary_db='stats',
+        normalize=True,
+        processes=1,
+        fts_path=str(tmp_path / 'fts.db')
+    )
+
+    doc = client['A']['2024-01-03'].find_one({'_id': IDS[0]})
+    assert doc['clean_content'] == IDS[0]
+    index = FullTextIndex(tmp_path / 'fts.db')
+    assert sorted(row['news_id'] for row in index.search('은행')) == IDS[:2]
+    index.close()
+    [row] = daily.query('A')
+    assert (row['count'], row['failures']) == (2, 1)
+
+
+def test_redrive_keeps_malformed_payloads(tmp_path):
+    client = mongomock.MongoClient()
+    dead_letters = DeadLetters.from_db(client, 'queue')
+    target = {
+        'press': 'A',
+        'begin': '2024-01-03',
+        'layout': 'daily',
+        'db_name': None,
+        'collection_name': None,
+        'time_series': False
+    }
+    dead_letters.add_news(IDS[0], target, 'HTTPStatus', 500)
+    dead_letters.add_news(IDS[1], target, 'HTTPStatus', 500)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.params['docId'] == IDS[0]:
+            return httpx.Response(200, content=b'<html>maintenance</html>')
+        return httpx.Response(200, json={'detail': {'DATE': '2024-01-03 09:00:00', 'CONTENT': 'a'}})
+
+    use_transport(httpx.MockTransport(handler))
+    counts = redrive(dead_letters, client)
+    assert counts == {'retried': 2, 'recovered': 1, 'failed': 1}
+    [item] = dead_letters.pending('news')
+    assert (item['key'], item['error'], item['attempts']) == (IDS[0], 'DecodeError', 2)
@@ -0,0 +1,112 @@
+from aiolimiter import AsyncLimiter
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from bigkinds_loader import enumerator
+from bigkinds_loader.api import HEADERS
+from bigkinds_loader.engine import get_engine
+from bigkinds_loader.enumerator import enumerate_ids, id_path
+
+
+IDS = [f'01100101.20240103{i:09d}' for i in range(250)]
+
+
+def search_transport(ids, fail=lambda page, size: False) -> httpx.MockTransport:
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        page, size = int(body['startNo']), int(body['resultNumber'])
+        if fail(page, size):
+            return httpx.Response(500)
+        return httpx.Response(200, json={
+            'totalCount': len(ids),
+            'resultList': [{'NEWS_ID': news_id} for news_id in ids[(page-1)*size:page*size]]
+        })
+    return httpx.MockTransport(handler)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    sleep = asyncio.sleep
+    monkeypatch.setattr(enumerator.asyncio, 'sleep', lambda seconds: sleep(0))
+
+
+@pytest.fixture
+def press_code(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'env').mkdir()
+    (tmp_path / 'env' / 'press_code.json').write_text(json.dumps([{'press': 'A', 'code': '01100101'}]))
+
+
+def use_transport(transport: httpx.MockTransport) -> None:
+    get_engine().clients[(None, 300, tuple(sorted(HEADERS.items())))] = httpx.AsyncClient(transport=transport)
+
+
+def test_enumerate_ids_saves_complete_store(press_code, tmp_path):
+    use_transport(search_transport(IDS))
+    stores = enumerate_ids('A', '2024-01-03', '2024-01-03', tmp_path / 'ids')
+    assert list(stores['A']) == IDS
+    assert id_path(tmp_path / 'ids', 'A', '2024-01-03', '2024-01-03').exists()
+
+
+def test_enumerate_ids_doesnt_save_failed_enumeration(press_code, tmp_path):
+    use_transport(search_transport(IDS, lambda page, size: True))
+    stores = enumerate_ids('A', '2024-01-03', '2024-01-03', tmp_path / 'ids', min_page_size=100)
+    assert len(stores['A']) == 0
+    # an outage must not turn the period into "0 articles" for the next runs
+    assert not id_path(tmp_path / 'ids', 'A', '2024-01-03', '2024-01-03').exists()
+
+
+def test_enumerate_ids_doesnt_save_missing_pages(press_code, tmp_path):
+    use_transport(search_transport(IDS, lambda page, size: page == 2))
+    stores = enumerate_ids('A', '2024-01-03', '2024-01-03', tmp_path / 'ids', min_page_size=100)
+    assert len(stores['A']) == 150
+    assert not id_path(tmp_path / 'ids', 'A', '2024-01-03', '2024-01-03').exists()
+
+
+def test_enumerate_ids_doesnt_save_total_mismatch(press_code, tmp_path):
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        page, size = int(body['startNo']), int(body['resultNumber'])
+        # one more article than the pages return
+        return httpx.Response(200, json={
+            'totalCount': len(IDS) + 1,
+            'resultList': [{'NEWS_ID': news_id} for news_id in IDS[(page-1)*size:page*size]]
+        })
+
+    use_transport(httpx.MockTransport(handler))
+    stores = enumerate_ids('A', '2024-01-03', '2024-01-03', tmp_path / 'ids')
+    assert len(stores['A']) == 250
+    assert not id_path(tmp_path / 'ids', 'A', '2024-01-03', '2024-01-03').exists()
+
+
+def test_fetch_span_offsets():
+    requests = []
+
+    def fail(page, size):
+        requests.append((page, size))
+        # pages of 100 and the 3rd page of 50 keep failing
+        return size == 100 or (page, size) == (3, 50)
+
+    async def fetch():
+        async with httpx.AsyncClient(transport=search_transport(IDS, fail)) as client:
+            return await enumerator.fetch_span(
+                client, AsyncLimiter(1000, 1), ['01100101'], '2024-01-03', '2024-01-03', 2, 100, 25, failed
+            )
+
+    failed = []
+    items, total = asyncio.run(fetch())
+    # page 2 of 100 is pages 3-4 of 50, page 3 of 50 is pages 5-6 of 25
+    assert [item['NEWS_ID'] for item in items] == IDS[100:200]
+    assert total == 250
+    assert {(page, size) for page, size in requests} == {(2, 100), (3, 50), (4, 50), (5, 25), (6, 25)}
+    assert failed == []
+
+
+def test_first_page_is_split(press_code, tmp_path):
+    use_transport(search_transport(IDS, lambda page, size: page == 1 and size == 100))
+    stores = enumerate_ids('A', '2024-01-03', '2024-01-03', tmp_path / 'ids', min_page_size=50)
+    assert list(stores['A']) == IDS
+    assert id_path(tmp_path / 'ids', 'A', '2024-01-03', '2024-01-03').exists()
@@ -0,0 +1,30 @@
+from bigkinds_loader.fts import FullTextIndex, ngrams, to_match
+
+
+def test_ngrams():
+    assert ngrams('한국은행 기준금리') == ['한국', '국은', '은행', '기준', '준금', '금리']
+    assert ngrams('은행 KOSPI 2.5%') == ['은행', 'KOSPI', '2', '5']
+
+
+def test_to_match():
+    assert to_match('한국은행 금리') == '"한국 국은 은행" AND "금리"'
+    assert to_match('!!') == ''
+
+
+def test_search(tmp_path):
+    index = FullTextIndex(tmp_path / 'fts.db')
+    index.add(
+        [
+            {'news_id': 'a', 'date': '2024-01-03 09:00:00', 'title': '한국은행 금리 동결', 'content': '기준금리를 동결했다'},
+            {'news_id': 'b', 'date': '2024-01-04 09:00:00', 'title': '증시', 'content': '은행주가 올랐다'},
+        ],
+        press='한국경제'
+    )
+    assert [row['news_id'] for row in index.search('은행')] == ['a', 'b']
+    assert [row['news_id'] for row in index.search('은행', end='2024-01-03')] == ['a']
+    assert index.search('은행', press='한겨레') == []
+
+    # re-indexing replaces the article
+    index.add([{'news_id': 'b', 'date': '2024-01-04 09:00:00', 'title': '증시', 'content': '반도체'}], press='한국경제')
+    assert [row['news_id'] for row in index.search('은행')] == ['a']
+    index.close()
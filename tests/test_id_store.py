@@ -0,0 +1,59 @@
+import pytest
+
+from bigkinds_loader.id_store import NewsIdStore, decode_id, encode_id
+
+
+IDS = [
+    '02100601.20240104090000001',
+    '01100101.20240103103252001',
+    '02100601.20240103103252001',
+    '02100601.20240103103252001',
+    '01100101.20240105000000002',
+]
+
+
+def test_encode_decode():
+    assert encode_id('02100601.20240103103252001') == (2100601, 20240103, 103252001)
+    assert decode_id(2100601, 20240103, 103252001) == '02100601.20240103103252001'
+    with pytest.raises(ValueError):
+        encode_id('02100601.2024')
+
+
+def test_sorted_and_deduplicated():
+    store = NewsIdStore.from_ids(IDS + [''])
+    assert len(store) == 4
+    assert list(store) == sorted(set(IDS))
+    assert '01100101.20240103103252001' in store
+    assert '01100101.20240103103252009' not in store
+    assert 'garbage' not in store
+
+
+def test_range_and_presses():
+    store = NewsIdStore.from_ids(IDS)
+    assert store.presses() == [1100101, 2100601]
+    assert list(store.range('2024-01-03', '2024-01-04', '02100601')) == [
+        '02100601.20240103103252001',
+        '02100601.20240104090000001'
+    ]
+    assert len(store.range('2024-01-04', '2024-01-05')) == 2
+
+
+def test_save_open_merge(tmp_path):
+    store = NewsIdStore.from_ids(IDS[:2])
+    store.save(tmp_path / 'a.ids')
+    opened = NewsIdStore.open(tmp_path / 'a.ids')
+    merged = NewsIdStore.merge([opened, NewsIdStore.from_ids(IDS[2:])])
+    assert list(merged) == sorted(set(IDS))
+    opened.close()
+
+
+def test_share_attach():
+    store = NewsIdStore.from_ids(IDS)
+    shm = store.share()
+    try:
+        attached = NewsIdStore.attach(shm.name)
+        assert list(attached) == list(store)
+        attached.close()
+    finally:
+        shm.close()
+        shm.unlink()
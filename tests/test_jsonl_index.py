@@ -0,0 +1,46 @@
+import orjson
+
+from bigkinds_loader.jsonl_index import JsonlReader, build_index, index_path
+
+
+DOCS = [
+    {'news_id': '02100601.20240104090000001', 'title': 'c'},
+    {'news_id': '01100101.20240103090000001', 'title': 'a'},
+    {'news_id': '02100601.20240103090000001', 'title': 'b'},
+    {'news_id': '01100101.20240105090000001', 'title': 'd'},
+]
+
+
+def export(path, docs):
+    path.write_bytes(b''.join(orjson.dumps(doc) + b'\n' for doc in docs))
+    return path
+
+
+def test_lookup(tmp_path):
+    path = export(tmp_path / 'news.jsonl', DOCS)
+    with JsonlReader(path) as reader:
+        # the index is built on first open
+        assert index_path(path).exists()
+        assert len(reader) == 4
+        assert reader.get('02100601.20240103090000001')['title'] == 'b'
+        assert '01100101.20240103090000001' in reader
+        assert reader.get('01100101.20240103090000002') is None
+        assert 'not an id' not in reader
+        assert reader.presses() == [1100101, 2100601]
+        assert list(reader.ids()) == sorted(doc['news_id'] for doc in DOCS)
+
+
+def test_range(tmp_path):
+    path = export(tmp_path / 'news.jsonl', DOCS)
+    build_index(path)
+    with JsonlReader(path) as reader:
+        assert [doc['title'] for doc in reader.range('2024-01-03')] == ['a', 'b']
+        assert [doc['title'] for doc in reader.range('2024-01-03', '2024-01-04')] == ['a', 'b', 'c']
+        assert [doc['title'] for doc in reader.range('2024-01-01', '2024-12-31', press='01100101')] == ['a', 'd']
+
+
+def test_empty_export(tmp_path):
+    path = export(tmp_path / 'news.jsonl', [])
+    with JsonlReader(path) as reader:
+        assert len(reader) == 0
+        assert list(reader.range('2024-01-03')) == []
@@ -0,0 +1,31 @@
+from bson import ObjectId
+import mongomock
+
+from bigkinds_loader import layout, writer
+from bigkinds_loader.layout import get_collection
+from bigkinds_loader.migrate import migrate
+from bigkinds_loader.writer import MongoWriter
+
+
+NEWS_ID = '01100101.20240103090000001'
+
+
+def test_migrated_news_are_keyed_by_news_id(monkeypatch):
+    # mongomock has no `Collection.options`
+    monkeypatch.setattr(layout, 'is_time_series', lambda collection: False)
+    monkeypatch.setattr(writer, 'is_time_series', lambda collection: False)
+
+    client = mongomock.MongoClient()
+    client['P']['2024-01-03'].insert_one({'_id': ObjectId(), 'news_id': NEWS_ID, 'date': '2024-01-03 09:00:00'})
+    assert migrate(client, 'P') == {'2024-01-03': 1}
+    # running it again skips the migrated documents
+    assert migrate(client, 'P') == {'2024-01-03': 1}
+
+    collection = get_collection(client, 'P', '', 'press')
+    assert collection.find_one()['_id'] == NEWS_ID
+    assert collection.index_information()['news_id_1']['unique']
+
+    # a crawl of the migrated period doesn't duplicate the article
+    with MongoWriter(collection) as w:
+        w.put({'news_id': NEWS_ID, 'date': '2024-01-03 09:00:00'})
+    assert collection.count_documents({}) == 1
@@ -0,0 +1,26 @@
+import unicodedata
+
+from bigkinds_loader.normalize import normalize_batch, normalize_text
+
+
+def test_markup_and_entities():
+    text = '<p>첫 문단&nbsp;입니다.</p><br/>둘째   문단 &amp;amp; 끝<br><br><br>'
+    # runs of line breaks collapse into one paragraph break
+    assert normalize_text(text) == '첫 문단 입니다.\n\n둘째 문단 & 끝'
+
+
+def test_nfc():
+    decomposed = unicodedata.normalize('NFD', '한국경제')
+    assert normalize_text(decomposed) == '한국경제'
+
+
+def test_byline_and_email():
+    text = '(서울=연합뉴스) 홍길동 기자 = 본문 hong@yna.co.kr 입니다.\n김철수 기자 kim@hankyung.com'
+    assert normalize_text(text).startswith('(서울=연합뉴스)')
+    assert normalize_text(text, strip_byline=True) == '본문 hong@yna.co.kr 입니다.'
+    assert normalize_text(text, strip_byline=True, strip_email=True) == '본문 입니다.'
+
+
+def test_batch():
+    batch = normalize_batch([{'content': '<b>a</b>'}, {'content': None}, {}])
+    assert [doc['clean_content'] for doc in batch] == ['a', '', '']
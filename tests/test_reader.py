@@ -0,0 +1,22 @@
+import mongomock
+
+from bigkinds_loader.reader import NewsReader
+
+
+def news(day: int) -> dict:
+    news_id = f'01100101.202401{day:02d}090000001'
+    return {'_id': news_id, 'news_id': news_id, 'date': f'2024-01-{day:02d} 09:00:00'}
+
+
+def test_daily_multi_day_shard():
+    client = mongomock.MongoClient()
+    db = client['P']
+    # a shard of 2024-01-01/2024-01-05 is stored under its first day
+    db['2024-01-01'].insert_many([news(day) for day in range(1, 6)])
+    db['2024-01-06'].insert_one(news(6))
+    db['2023-12-01'].insert_one(news(1) | {'_id': '01100101.20231201090000001', 'date': '2023-12-01 09:00:00'})
+
+    reader = NewsReader(client)
+    assert [c.name for c in reader.collections('P', '2024-01-03', '2024-01-06')] == ['2024-01-01', '2024-01-06']
+    dates = [doc['date'] for batch in reader.read('P', '2024-01-03', '2024-01-04') for doc in batch]
+    assert sorted(dates) == ['2024-01-03 09:00:00', '2024-01-04 09:00:00']
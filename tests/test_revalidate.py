@@ -0,0 +1,45 @@
+import httpx
+import mongomock
+
+from bigkinds_loader.api import HEADERS
+from bigkinds_loader.engine import get_engine
+from bigkinds_loader.fts import FullTextIndex
+from bigkinds_loader.record import content_hash
+from bigkinds_loader.revalidate import HISTORY_COLLECTION, revalidate
+
+
+def detail_transport(contents) -> httpx.MockTransport:
+    def handler(request: httpx.Request) -> httpx.Response:
+        news_id = request.url.params['docId']
+        return httpx.Response(200, json={'detail': {
+            'DATE': '2024-01-03 09:00:00',
+            'TITLE': 'title',
+            'CONTENT': contents[news_id]
+        }})
+    return httpx.MockTransport(handler)
+
+
+def test_revalidate_rewrites_edited_articles(tmp_path):
+    contents = {'a': '<p>본문 수정</p>', 'b': '그대로'}
+    get_engine().clients[(None, 300, tuple(sorted(HEADERS.items())))] = \
+        httpx.AsyncClient(transport=detail_transport(contents))
+
+    client = mongomock.MongoClient()
+    collection = client['P']['2024-01-03']
+    for news_id, content in (('a', '본문'), ('b', '그대로')):
+        doc = {'_id': news_id, 'news_id': news_id, 'date': '2024-01-03 09:00:00', 'title': 'title', 'content': content}
+        collection.insert_one(doc | {'content_hash': content_hash(doc), 'clean_content': content})
+
+    counts = revalidate('P', '2024-01-03', '2024-01-03', client=client, fts_path=tmp_path / 'fts.db')
+    assert counts == {'checked': 2, 'changed': 1, 'failed': 0}
+
+    doc = collection.find_one({'_id': 'a'})
+    assert doc['content'] == '<p>본문 수정</p>'
+    assert doc['clean_content'] == '본문 수정'
+    assert doc['revision'] == 1
+    assert collection.find_one({'_id': 'b'}).get('revision') is None
+    assert [h['content'] for h in client['P'][HISTORY_COLLECTION].find()] == ['본문']
+
+    index = FullTextIndex(tmp_path / 'fts.db')
+    assert [row['news_id'] for row in index.search('수정')] == ['a']
+    index.close()
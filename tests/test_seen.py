@@ -0,0 +1,76 @@
+from bigkinds_loader.seen import BloomFilter, ScalableBloomFilter, SeenSet
+
+
+def test_bloom_filter_persists(tmp_path):
+    bloom = BloomFilter.create(tmp_path / 'a.bloom', 1000, 1e-3)
+    bloom.add('02100601.20240103103252001')
+    assert '02100601.20240103103252001' in bloom
+    assert bloom.count == 1
+    bloom.close()
+
+    bloom = BloomFilter(tmp_path / 'a.bloom', readonly=True)
+    assert '02100601.20240103103252001' in bloom
+    assert '02100601.20240103103252002' not in bloom
+    bloom.close()
+
+
+def test_scalable_bloom_filter_grows(tmp_path):
+    bloom = ScalableBloomFilter(tmp_path, capacity=10)
+    keys = [f'key{i}' for i in range(100)]
+    for key in keys:
+        bloom.add(key)
+
+    assert len(bloom.filters) > 1
+    assert len(bloom) == 100
+    assert all(key in bloom for key in keys)
+    bloom.close()
+
+    assert len(ScalableBloomFilter(tmp_path, capacity=10, readonly=True)) == 100
+
+
+def test_seen_set_checks_hits(tmp_path):
+    stored = {'a'}
+    lookups = []
+
+    def exists(key):
+        lookups.append(key)
+        return key in stored
+
+    seen = SeenSet(ScalableBloomFilter(tmp_path), exists)
+    seen.add('a')
+    seen.add('b')
+    assert seen.seen('a')
+    # a hit of the filter missing from the storage is not skipped
+    assert not seen.seen('b')
+    assert not seen.seen('c')
+    assert lookups == ['a', 'b']
+    seen.close()
+
+
+def test_workers_share_the_filters(tmp_path):
+    # two workers opened before either of them created a filter
+    a = ScalableBloomFilter(tmp_path, capacity=10, readonly=True)
+    b = ScalableBloomFilter(tmp_path, capacity=10, readonly=True)
+    keys_a = [f'a{i}' for i in range(30)]
+    keys_b = [f'b{i}' for i in range(30)]
+    a.update(keys_a)
+    b.update(keys_b)
+    assert all(key in b for key in keys_a + keys_b)
+    a.close()
+    b.close()
+
+    bloom = ScalableBloomFilter(tmp_path, capacity=10, readonly=True)
+    assert len(bloom) == 60
+    assert all(key in bloom for key in keys_a + keys_b)
+    bloom.close()
+
+
+def test_seen_set_buffers_readonly_adds(tmp_path):
+    seen = SeenSet(ScalableBloomFilter(tmp_path, readonly=True), lambda key: True)
+    seen.add('a')
+    assert not seen.seen('a')
+    seen.close()
+
+    seen = SeenSet(ScalableBloomFilter(tmp_path, readonly=True), lambda key: True)
+    assert seen.seen('a')
+    seen.close()
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+import pytest
+
+from bigkinds_loader.work_queue import WorkQueue, split_period
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient(tz_aware=True)['bigkinds_queue']['jobs']
+
+
+def expire(queue: WorkQueue, job) -> None:
+    queue.collection.update_one(
+        {'_id': job['_id']},
+        {'$set': {'lease_expires': datetime.now(timezone.utc) - timedelta(seconds=1)}}
+    )
+
+
+def test_split_period():
+    assert list(split_period('2024-01-30', '2024-02-02', 3)) == [
+        ('2024-01-30', '2024-02-01'),
+        ('2024-02-02', '2024-02-02')
+    ]
+
+
+def test_enqueue_is_idempotent(collection):
+    queue = WorkQueue(collection)
+    assert queue.enqueue('A', '2024-01-01', '2024-01-03') == 3
+    assert queue.enqueue('A', '2024-01-01', '2024-01-04') == 1
+    assert queue.stats() == {'pending': 4}
+
+
+def test_claim_leases_each_job_once(collection):
+    queue = WorkQueue(collection, worker_id='w1')
+    queue.enqueue('A', '2024-01-01', '2024-01-02')
+
+    first, second = queue.claim(), queue.claim()
+    assert {first['_id'], second['_id']} == {'A:2024-01-01:2024-01-01', 'A:2024-01-02:2024-01-02'}
+    assert first['state'] == 'leased' and first['owner'] == 'w1' and first['attempts'] == 1
+    assert queue.claim() is None
+
+
+def test_complete_and_fail(collection):
+    queue = WorkQueue(collection, max_attempts=2)
+    queue.enqueue('A', '2024-01-01', '2024-01-01')
+
+    queue.fail(queue.claim(), 'boom')
+    assert queue.stats() == {'pending': 1}
+    queue.fail(queue.claim(), 'boom')
+    assert queue.stats() == {'failed': 1}
+    assert queue.claim() is None
+
+    queue.enqueue('A', '2024-01-02', '2024-01-02')
+    queue.complete(queue.claim())
+    assert queue.stats() == {'failed': 1, 'done': 1}
+
+
+def test_expired_lease_is_reclaimed(collection):
+    queue = WorkQueue(collection, worker_id='w1')
+    queue.enqueue('A', '2024-01-01', '2024-01-01')
+    job = queue.claim()
+    assert queue.claim() is None
+
+    expire(queue, job)
+    other = WorkQueue(collection, worker_id='w2')
+    job = other.claim()
+    assert job['owner'] == 'w2' and job['attempts'] == 2
+    # the first worker lost its lease
+    assert not queue.heartbeat(job)
+    assert other.heartbeat(job)
+
+
+def test_expired_lease_out_of_attempts_fails(collection):
+    queue = WorkQueue(collection, max_attempts=2)
+    queue.enqueue('A', '2024-01-01', '2024-01-01')
+    for _ in range(2):
+        expire(queue, queue.claim())
+
+    assert queue.claim() is None
+    assert queue.stats() == {'failed': 1}
+
+
+def test_drain_fails_exiting_handler(collection):
+    queue = WorkQueue(collection, max_attempts=1)
+    queue.enqueue('A', '2024-01-01', '2024-01-02')
+
+    def handler(job):
+        if job['begin'] == '2024-01-01':
+            raise SystemExit(0)
+
+    assert queue.drain(handler) == 1
+    assert queue.stats() == {'failed': 1, 'done': 1}
+
+
+def test_priority_and_fair_share(collection):
+    queue = WorkQueue(collection, weights={'A': 2})
+    queue.enqueue(['A', 'B'], '2024-01-01', '2024-01-31')
+    queue.enqueue('C', '2024-01-01', '2024-01-01', priority='daily')
+
+    assert queue.claim()['press'] == 'C'
+    presses = [queue.claim()['press'] for _ in range(30)]
+    # twice the share of B, give or take the claims before both have a virtual time
+    assert abs(presses.count('A') - 2 * presses.count('B')) <= 3
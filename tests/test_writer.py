@@ -0,0 +1,26 @@
+import mongomock
+
+from bigkinds_loader.writer import MongoWriter
+
+
+def write(collection, ids, **kwargs):
+    committed = []
+    with MongoWriter(collection, 2, on_commit=[committed.extend], **kwargs) as writer:
+        for news_id in ids:
+            writer.put({'news_id': news_id})
+    return [doc['news_id'] for doc in committed]
+
+
+def test_rerun_is_idempotent():
+    collection = mongomock.MongoClient()['P']['2024-01-03']
+    assert write(collection, ['a', 'b', 'c'], dedupe=False) == ['a', 'b', 'c']
+    assert write(collection, ['b', 'c', 'd'], dedupe=False) == ['d']
+    assert collection.count_documents({}) == 4
+
+
+def test_dedupe_without_unique_id():
+    # time series collections don't reject a duplicated `_id`
+    collection = mongomock.MongoClient()['P']['news']
+    assert write(collection, ['a', 'b', 'b', 'c'], key=None, dedupe=True) == ['a', 'b', 'c']
+    assert write(collection, ['c', 'd'], key=None, dedupe=True) == ['d']
+    assert collection.count_documents({}) == 4